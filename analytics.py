@@ -0,0 +1,123 @@
+import logging
+from datetime import date
+
+import numpy as np
+
+from periods import month_number
+
+logger = logging.getLogger(__name__)
+
+# 1970-01-01 был четвергом: сдвиг, чтобы понедельник получил номер 0
+WEEKDAY_SHIFT = 3
+
+
+class ExpenseSeries:
+    """Расходы в виде колонок numpy: день, сумма, код категории"""
+
+    def __init__(self, rows):
+        if rows:
+            days, amounts, categories = zip(*rows)
+        else:
+            days, amounts, categories = (), (), ()
+        self.days = np.array(days, dtype=np.int32)
+        self.amounts = np.array(amounts, dtype=np.float64)
+        # Категории храним кодами, имена - отдельным списком
+        self.category_names, codes = np.unique(np.array(categories, dtype=object), return_inverse=True)
+        self.category_names = [str(name) for name in self.category_names]
+        self.category_codes = codes.astype(np.int32)
+        # Номер месяца с января 1970 года
+        self.months = self.days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+class Analytics:
+    """Аналитика расходов: тренды, скользящие средние, профили по дням недели"""
+
+    def __init__(self, db):
+        self.db = db
+        # Кэш загруженных рядов: user_id (кортеж участников - семья) -> (версия данных, ряд)
+        self._cache = {}
+
+    def get_series(self, user_id):
+        """Ряд расходов из кэша или из базы, если данные изменились"""
+        version = self.db.get_data_version(user_id)
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        series = ExpenseSeries(self.db.get_expense_series(user_id))
+        self._cache[user_id] = (version, series)
+        logger.debug("Загружено %d расходов для аналитики (%s)", len(series), user_id)
+        return series
+
+    @staticmethod
+    def _current_month():
+        return month_number(date.today())
+
+    def monthly_totals(self, user_id, months=12):
+        """Суммы по последним месяцам, включая текущий: (номера месяцев, суммы)"""
+        series = self.get_series(user_id)
+        last = self._current_month()
+        first = last - months + 1
+
+        mask = series.months >= first
+        totals = np.bincount(series.months[mask] - first,
+                             weights=series.amounts[mask], minlength=months)[:months]
+        return np.arange(first, last + 1), totals
+
+    def month_over_month(self, user_id, months=6):
+        """Суммы по месяцам и изменение к предыдущему месяцу в процентах"""
+        month_numbers, totals = self.monthly_totals(user_id, months + 1)
+        previous = totals[:-1]
+        current = totals[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deltas = np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+        return month_numbers[1:], current, deltas
+
+    def moving_averages(self, user_id, windows=(3, 6, 12)):
+        """Скользящие средние месячных расходов по завершенным месяцам"""
+        longest = max(windows)
+        # Текущий месяц не завершен, поэтому берем на один месяц больше и отбрасываем его
+        _, totals = self.monthly_totals(user_id, longest + 1)
+        totals = totals[:-1]
+
+        result = {}
+        for window in windows:
+            averages = np.convolve(totals, np.ones(window) / window, mode='valid')
+            result[window] = float(averages[-1])
+        return result
+
+    def weekday_profile(self, user_id):
+        """Средние расходы в каждый день недели за всю историю"""
+        series = self.get_series(user_id)
+        if not len(series):
+            return np.zeros(7)
+
+        weekdays = (series.days + WEEKDAY_SHIFT) % 7
+        totals = np.bincount(weekdays, weights=series.amounts, minlength=7)
+
+        # Сколько раз каждый день недели встречался в периоде истории
+        all_days = np.arange(series.days.min(), series.days.max() + 1)
+        counts = np.bincount((all_days + WEEKDAY_SHIFT) % 7, minlength=7)
+        return totals / np.maximum(counts, 1)
+
+    def category_share_trend(self, user_id, months=6):
+        """Доли категорий по месяцам: (номера месяцев, имена категорий, матрица долей в %)"""
+        series = self.get_series(user_id)
+        last = self._current_month()
+        first = last - months + 1
+        categories_count = len(series.category_names)
+
+        mask = series.months >= first
+        index = (series.months[mask] - first) * categories_count + series.category_codes[mask]
+        sums = np.bincount(index, weights=series.amounts[mask],
+                           minlength=months * categories_count)
+        sums = sums[:months * categories_count].reshape(months, categories_count)
+
+        month_totals = sums.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = np.where(month_totals > 0, sums / month_totals * 100, 0.0)
+        return np.arange(first, last + 1), series.category_names, shares
+
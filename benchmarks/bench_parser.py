@@ -0,0 +1,47 @@
+"""Скорость разбора расходов, введенных одной строкой
+
+Запуск из корня проекта: python benchmarks/bench_parser.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from expense_parser import CATEGORY_ALIASES, ExpenseParser
+
+SAMPLES = [
+    "350 еда обед",
+    "1200,50 бензин",
+    "89.90 продукты хлеб молоко",
+    "15000 аренда квартира за май",
+    "450 руб связь",
+    "12€ еда кофе",
+    "300 try посиделки",
+    "2300 ветеринар прививка коту",
+    "700 что-то непонятное",
+    "120",
+    "01.12.2024-15.12.2024",
+    "💸 Добавить расход",
+]
+INPUTS_COUNT = 500_000
+
+
+def main():
+    parser = ExpenseParser(list(CATEGORY_ALIASES))
+    inputs = SAMPLES * (INPUTS_COUNT // len(SAMPLES))
+    parse = parser.parse
+
+    for text in SAMPLES:
+        print(f"{text!r:35} -> {parse(text)}")
+
+    start = time.perf_counter()
+    for text in inputs:
+        parse(text)
+    elapsed = time.perf_counter() - start
+
+    print(f"\nРазобрано {len(inputs)} строк за {elapsed:.3f} с: {len(inputs) / elapsed:,.0f} строк/с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Скорость сборки отчетов: список из 10 000 расходов
+
+Сравнивается новая сборка (rendering.py) со старой: конкатенация строк,
+strptime для каждой даты и разрезание готового текста по 4000 символов.
+
+Запуск из корня проекта: python benchmarks/bench_rendering.py
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rendering import MESSAGE_LIMIT, expense_report
+
+ROWS_COUNT = 10_000
+REPEATS = 20
+CATEGORIES = ["🍔 Еда", "🚗 Транспорт", "🏠 Дом", "👗 Одежда", "💊 Здоровье"]
+DESCRIPTIONS = ["", "обед", "такси <ночью>", "продукты & хозтовары", "аренда_за_май *срочно*"]
+
+
+def make_expenses():
+    rng = random.Random(1)
+    start = datetime(2024, 1, 1)
+    return [
+        (rng.choice(CATEGORIES), rng.uniform(50, 5000), rng.choice(DESCRIPTIONS),
+         str(start + timedelta(minutes=rng.randrange(500_000), microseconds=rng.randrange(2) * 123456)))
+        for _ in range(ROWS_COUNT)
+    ]
+
+
+def old_report(expenses):
+    """Сборка отчета, как было раньше в bot.show_all_expenses"""
+    message = "📋 **Все расходы**\n\n"
+    total = 0
+    for i, (category, amount, description, date) in enumerate(expenses, 1):
+        total += amount
+        try:
+            if '.' in date:
+                date_str = datetime.strptime(date, '%Y-%m-%d %H:%M:%S.%f').strftime('%d.%m.%Y')
+            else:
+                date_str = datetime.strptime(date, '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
+        except ValueError:
+            date_str = date.split()[0]
+        desc = description if description else "без описания"
+        message += f"{i}. **{category}** - {amount:.2f} руб.\n"
+        message += f"   📅 {date_str} | 📝 {desc}\n\n"
+    message += f"💵 **Итого:** {total:.2f} руб.\n"
+    message += f"📊 **Всего записей:** {len(expenses)}"
+    return [message[i:i + 4000] for i in range(0, len(message), 4000)]
+
+
+def measure(build, expenses):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        messages = build(expenses)
+    return (time.perf_counter() - start) / REPEATS, messages
+
+
+def main():
+    expenses = make_expenses()
+    for title, build in (("Старая сборка", old_report), ("rendering.py", lambda rows: expense_report("📋 Все расходы", rows))):
+        elapsed, messages = measure(build, expenses)
+        longest = max(len(message) for message in messages)
+        print(f"{title}: {elapsed * 1000:.1f} мс на отчет, сообщений: {len(messages)}, "
+              f"самое длинное: {longest} (лимит {MESSAGE_LIMIT})")
+
+
+if __name__ == '__main__':
+    main()
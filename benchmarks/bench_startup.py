@@ -0,0 +1,84 @@
+"""Время старта бота: импорт, создание ExpenseBot и ответ на первое обновление
+
+Обновление /start кладется в очередь локального Bot API до запуска процесса бота
+(как если бы пользователь написал во время перезапуска). Замеряется время от
+запуска процесса до ответа бота. Два прогона: новая база и уже созданная.
+
+Импорт показан двумя частями: python-telegram-bot и остальной код бота.
+Первая часть - нижняя граница старта: без PTB бот не получит обновление.
+
+Запуск из корня проекта: python benchmarks/bench_startup.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotApi
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:BENCHMARK'
+USER_ID = 42
+
+
+def child(db_name, base_url):
+    """Процесс бота: печатает отметки времени этапов старта"""
+    started = time.time()
+    import telegram.ext  # noqa: F401
+    ptb_imported = time.time()
+    from bot import ExpenseBot
+    from storage import SQLiteStorage
+    imported = time.time()
+    bot = ExpenseBot(TOKEN, storage=SQLiteStorage(db_name), base_url=base_url)
+    ready = time.time()
+    print(f"ptb {ptb_imported - started:.4f}", flush=True)
+    print(f"import {imported - ptb_imported:.4f}", flush=True)
+    print(f"init {ready - imported:.4f}", flush=True)
+    bot.run()
+
+
+async def measure(db_name):
+    api = FakeBotApi(TOKEN)
+    await api.start()
+    first_reply = asyncio.get_running_loop().create_future()
+    api.on_reply = lambda chat_id, method, params: first_reply.done() or first_reply.set_result(time.time())
+    api.push_update(api.text_update(USER_ID, '/start'))
+
+    spawned = time.time()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), '--child', db_name, api.base_url,
+        cwd=ROOT, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        replied = await asyncio.wait_for(first_reply, 60)
+        marks = {}
+        for _ in range(3):
+            name, value = (await process.stdout.readline()).decode().split()
+            marks[name] = float(value)
+    finally:
+        process.terminate()
+        await process.wait()
+        await api.stop()
+    return marks['ptb'], marks['import'], marks['init'], replied - spawned
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], sys.argv[3])
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, 'expenses.db')
+        for title in ('Новая база', 'Существующая база'):
+            ptb, imported, init, first_update = asyncio.run(measure(db_name))
+            print(f"{title}: импорт python-telegram-bot {ptb * 1000:.0f} мс, "
+                  f"импорт бота {imported * 1000:.0f} мс, "
+                  f"создание бота {init * 1000:.0f} мс, "
+                  f"до ответа на первое обновление {first_update * 1000:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Локальная замена Telegram Bot API для бенчмарков и нагрузочных тестов
+
+Бот подключается к ней через ExpenseBot(token, base_url=FakeBotApi.base_url).
+Пока вебхук не установлен (setWebhook), сервер отдает обновления через
+getUpdates; после установки - сам отправляет их POST-запросами на адрес
+вебхука, как Telegram. Ответы бота передаются в обработчик on_reply.
+"""
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qsl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import minihttp
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'ExpenseBot', 'username': 'expense_bot'}
+
+# Повторы доставки вебхука, если бот не ответил 200 (как делает Telegram)
+WEBHOOK_RETRIES = 5
+WEBHOOK_RETRY_DELAY = 0.5
+
+
+def parse_params(request):
+    """Параметры метода Bot API: form-urlencoded (значения - JSON) или JSON-тело"""
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith('application/json'):
+        return json.loads(request.body or b'{}')
+
+    if content_type.startswith('multipart/form-data'):
+        # Файлы нам не нужны, достаточно простых полей (chat_id, caption)
+        boundary = content_type.split('boundary=', 1)[1].strip('"').encode()
+        raw = {}
+        for part in request.body.split(b'--' + boundary):
+            head, _, value = part.partition(b'\r\n\r\n')
+            if b'name="' not in head or b'filename="' in head:
+                continue
+            name = head.split(b'name="', 1)[1].split(b'"', 1)[0].decode()
+            raw[name] = value.rstrip(b'\r\n').decode('utf-8', 'replace')
+    else:
+        raw = dict(parse_qsl(request.body.decode()))
+
+    params = {}
+    for name, value in raw.items():
+        try:
+            params[name] = json.loads(value)
+        except ValueError:
+            params[name] = value
+    return params
+
+
+class FakeBotApi:
+    def __init__(self, token, host='127.0.0.1', port=8081):
+        self.token = token
+        self.host = host
+        self.port = port
+        self.base_url = f"http://{host}:{port}/bot"
+        self._updates = []
+        self._new_update = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        # Обработчик ответов бота: on_reply(chat_id, method, params)
+        self.on_reply = None
+        self.requests = 0
+        # Вебхук: адрес, секрет, сколько раз его устанавливали и число неудачных доставок
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.webhook_sets = 0
+        self.delivery_errors = 0
+        self._deliveries = set()
+        self._client = None
+        self._server = None
+
+    async def start(self):
+        self._server = await minihttp.serve(self.handle, self.host, self.port)
+
+    async def stop(self):
+        for task in self._deliveries:
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # Обновления для бота
+
+    def push_update(self, update):
+        update['update_id'] = next(self._update_ids)
+        if self.webhook_url is not None:
+            task = asyncio.create_task(self._deliver(update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+            return
+        self._updates.append(update)
+        self._new_update.set()
+
+    async def _deliver(self, update):
+        """Доставка обновления на вебхук с повторами"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=None))
+        headers = {'content-type': 'application/json'}
+        if self.webhook_secret:
+            headers['x-telegram-bot-api-secret-token'] = self.webhook_secret
+        body = json.dumps(update).encode()
+        for _ in range(WEBHOOK_RETRIES):
+            try:
+                response = await self._client.post(self.webhook_url, content=body, headers=headers)
+                if response.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            self.delivery_errors += 1
+            await asyncio.sleep(WEBHOOK_RETRY_DELAY)
+
+    def text_update(self, user_id, text):
+        """Обновление с текстовым сообщением пользователя"""
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+            'text': text,
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return {'message': message}
+
+    # HTTP
+
+    async def handle(self, request):
+        prefix = f"/bot{self.token}/"
+        if not request.path.startswith(prefix):
+            return 404, b''
+        self.requests += 1
+        method = request.path[len(prefix):]
+        params = parse_params(request)
+
+        handler = getattr(self, f"api_{method}", None)
+        result = await handler(params) if handler else True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    # Методы Bot API
+
+    async def api_getMe(self, params):
+        return BOT_USER
+
+    async def api_getUpdates(self, params):
+        offset = int(params.get('offset', 0))
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(params.get('timeout', 0)))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get('limit', 100))]
+
+    async def api_setWebhook(self, params):
+        self.webhook_url = params.get('url') or None
+        self.webhook_secret = params.get('secret_token')
+        self.webhook_sets += 1
+        return True
+
+    async def api_deleteWebhook(self, params):
+        self.webhook_url = None
+        self.webhook_secret = None
+        return True
+
+    async def api_sendMessage(self, params):
+        return self._reply('sendMessage', params, text=params.get('text', ''))
+
+    async def api_sendPhoto(self, params):
+        file_id = f"photo{next(self._message_ids)}"
+        photo = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 400}]
+        return self._reply('sendPhoto', params, photo=photo)
+
+    def _reply(self, method, params, **content):
+        chat_id = int(params['chat_id'])
+        if self.on_reply is not None:
+            self.on_reply(chat_id, method, params)
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            **content,
+        }
@@ -0,0 +1,269 @@
+"""Нагрузочный тест бота целиком на локальном Bot API (fake_bot_api.py)
+
+N семей по USERS_PER_HOUSEHOLD пользователей одновременно проходят сценарий:
+добавление расхода через диалог, быстрый ввод одной строкой и меню статистики.
+Каждый пользователь отправляет следующее сообщение только после ответа бота
+на предыдущее. Задержка шага - от отправки обновления до получения ответа.
+
+Режимы:
+    polling - один процесс бота забирает обновления через getUpdates;
+    webhook - роутер вебхуков (webhook_router.py) и --workers процессов бота,
+              обновления доставляются POST-запросами на вебхук.
+
+Бот запускается отдельными процессами с базой во временном каталоге.
+Переменная окружения STORAGE=sharded передается процессам бота; семьи
+(HOUSEHOLDS) формируются тестом.
+
+Запуск из корня проекта:
+    python benchmarks/load_test.py --mode polling --households 50
+    python benchmarks/load_test.py --mode webhook --households 50 --workers 4
+    python benchmarks/load_test.py --mode both
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotApi
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:LOADTEST'
+WEBHOOK_SECRET = 'loadtestsecret'
+
+API_PORT = 8091
+ROUTER_PORT = 8090
+WORKER_BASE_PORT = 8100
+
+USERS_PER_HOUSEHOLD = 2
+# Сколько ждать ответа бота на один шаг (секунды); дольше - ошибка
+STEP_TIMEOUT = 30
+# Сколько ждать запуска процессов бота (секунды)
+STARTUP_TIMEOUT = 60
+
+# Шаг сценария: (название, текст сообщения, сколько сообщений бот присылает в ответ).
+# В тексте подставляются {amount}, {category}, {description}
+ADD_EXPENSE = [
+    ('add:start', '💸 Добавить расход', 1),
+    ('add:amount', '{amount}', 1),
+    ('add:category', '{category}', 1),
+    ('add:description', '{description}', 1),
+]
+QUICK_ADD = [
+    ('add:quick', '{amount} еда {description}', 1),
+]
+STATS = [
+    ('stats:menu', '📊 Статистика', 1),
+    ('stats:today', '📊 Сегодня', 1),
+    ('stats:month', '📈 Месяц', 1),
+    ('stats:trends', '📉 Тренды', 1),
+    ('stats:back', '↩️ Назад', 1),
+]
+SCENARIO = ADD_EXPENSE + QUICK_ADD + STATS
+
+CATEGORIES = ['🍔 Еда', '⛽️ Бензин', '🏠 Дом', '💊 Здоровье', '🍺 Посиделки']
+DESCRIPTIONS = ['обед', 'кофе', 'продукты', 'такси', 'аптека']
+
+
+def child(mode, worker_index, worker_count):
+    """Процесс бота (polling или один из процессов за роутером вебхуков)"""
+    sys.path.insert(0, ROOT)
+    from bot import ExpenseBot
+    from storage import create_storage_from_env
+
+    bot = ExpenseBot(
+        TOKEN,
+        storage=create_storage_from_env(),
+        worker_index=worker_index,
+        worker_count=worker_count,
+        base_url=f"http://127.0.0.1:{API_PORT}/bot"
+    )
+    if mode == 'webhook':
+        bot.run_webhook(f"http://127.0.0.1:{ROUTER_PORT}/telegram", WORKER_BASE_PORT, WEBHOOK_SECRET)
+    else:
+        bot.run()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoadTest:
+    def __init__(self, mode, households, rounds, workers, think):
+        self.mode = mode
+        self.households = [
+            [household * 100 + member + 1 for member in range(USERS_PER_HOUSEHOLD)]
+            for household in range(1, households + 1)
+        ]
+        self.rounds = rounds
+        self.workers = workers if mode == 'webhook' else 1
+        self.think = think
+        self.api = FakeBotApi(TOKEN, port=API_PORT)
+        # chat_id -> очередь текстов ответов бота
+        self.replies = defaultdict(asyncio.Queue)
+        # название шага -> задержки (секунды) и число ошибок
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.processes = []
+        self.log_path = None
+
+    def on_reply(self, chat_id, method, params):
+        self.replies[chat_id].put_nowait(str(params.get('text', '')))
+
+    async def start_bot(self, directory):
+        env = dict(
+            os.environ,
+            DB_NAME=os.path.join(directory, 'expenses.db'),
+            SHARD_DIR=os.path.join(directory, 'shards'),
+            HOUSEHOLDS=';'.join(','.join(map(str, members)) for members in self.households),
+            WORKER_COUNT=str(self.workers),
+            WORKER_BASE_PORT=str(WORKER_BASE_PORT),
+            ROUTER_HOST='127.0.0.1',
+            ROUTER_PORT=str(ROUTER_PORT),
+        )
+        self.log_path = os.path.join(directory, 'bot.log')
+        log = open(self.log_path, 'wb')
+        if self.mode == 'webhook':
+            self.processes.append(subprocess.Popen(
+                [sys.executable, 'webhook_router.py'], cwd=ROOT, env=env, stdout=log, stderr=log
+            ))
+        for index in range(self.workers):
+            self.processes.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--child', self.mode, str(index), str(self.workers)],
+                cwd=ROOT, env=env, stdout=log, stderr=log
+            ))
+
+        if self.mode == 'webhook':
+            await self.wait_for_port(ROUTER_PORT)
+            for index in range(self.workers):
+                await self.wait_for_port(WORKER_BASE_PORT + index)
+
+    async def wait_for_port(self, port, timeout=STARTUP_TIMEOUT):
+        """Ожидание, пока на порту начнут принимать соединения"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.close()
+                return
+            except OSError:
+                if any(process.poll() is not None for process in self.processes):
+                    self.fail("Процесс бота или роутера завершился при запуске")
+                if time.monotonic() > deadline:
+                    self.fail(f"Порт {port} не открылся за {timeout} с")
+                await asyncio.sleep(0.1)
+
+    def fail(self, reason):
+        """Остановка теста с выводом конца лога процессов бота"""
+        with open(self.log_path, 'rb') as log:
+            sys.stderr.write(log.read()[-4000:].decode('utf-8', 'replace'))
+        raise RuntimeError(reason)
+
+    def stop_bot(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+        self.processes.clear()
+
+    async def send(self, user_id, text, replies, timeout=STEP_TIMEOUT):
+        """Отправка сообщения и ожидание ответов. Возвращает (задержка, тексты ответов)"""
+        queue = self.replies[user_id]
+        started = time.perf_counter()
+        self.api.push_update(self.api.text_update(user_id, text))
+        texts = [await asyncio.wait_for(queue.get(), timeout) for _ in range(replies)]
+        return time.perf_counter() - started, texts
+
+    async def run_user(self, user_id, rng):
+        for _ in range(self.rounds):
+            for name, template, replies in SCENARIO:
+                text = template.format(
+                    amount=rng.randint(50, 5000),
+                    category=rng.choice(CATEGORIES),
+                    description=rng.choice(DESCRIPTIONS),
+                )
+                try:
+                    latency, texts = await self.send(user_id, text, replies)
+                except asyncio.TimeoutError:
+                    # Состояние диалога неизвестно - дальше этот пользователь не продолжает
+                    self.errors[name] += 1
+                    return
+                self.latencies[name].append(latency)
+                if any(reply.startswith('❌') for reply in texts):
+                    self.errors[name] += 1
+                if self.think:
+                    await asyncio.sleep(rng.expovariate(1 / self.think))
+
+    async def run(self):
+        self.api.on_reply = self.on_reply
+        await self.api.start()
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                await self.start_bot(directory)
+                users = [user_id for members in self.households for user_id in members]
+
+                # Прогрев: /start от каждого пользователя, заодно ждем готовности бота
+                try:
+                    await asyncio.gather(*(self.send(user_id, '/start', 1, STARTUP_TIMEOUT) for user_id in users))
+                except asyncio.TimeoutError:
+                    self.fail("Бот не ответил на прогрев")
+                self.api.delivery_errors = 0
+
+                started = time.perf_counter()
+                await asyncio.gather(*(self.run_user(user_id, random.Random(user_id)) for user_id in users))
+                elapsed = time.perf_counter() - started
+            finally:
+                self.stop_bot()
+                await self.api.stop()
+        self.report(len(users), elapsed)
+
+    def report(self, users, elapsed):
+        steps = sum(len(values) for values in self.latencies.values())
+        errors = sum(self.errors.values())
+        planned = users * self.rounds * len(SCENARIO)
+        every = [value for values in self.latencies.values() for value in values]
+
+        print(f"\n=== {self.mode}: семей {len(self.households)}, пользователей {users}, "
+              f"процессов бота {self.workers} ===")
+        print(f"Шагов выполнено: {steps} из {planned} за {elapsed:.1f} с, "
+              f"пропускная способность {steps / elapsed:.1f} сообщ./с")
+        print(f"Ошибок: {errors} ({errors / planned:.2%}), неудачных доставок вебхука: {self.api.delivery_errors}")
+        if every:
+            print(f"Задержка: p50 {percentile(every, 0.5) * 1000:.0f} мс, "
+                  f"p99 {percentile(every, 0.99) * 1000:.0f} мс")
+        print(f"{'шаг':18} {'кол-во':>7} {'p50, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+        for name, _, _ in SCENARIO:
+            values = self.latencies.get(name)
+            if not values:
+                continue
+            print(f"{name:18} {len(values):>7} {percentile(values, 0.5) * 1000:>9.0f} "
+                  f"{percentile(values, 0.99) * 1000:>9.0f} {self.errors[name]:>7}")
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['polling', 'webhook', 'both'], default='both')
+    parser.add_argument('--households', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3, help="повторов сценария на пользователя")
+    parser.add_argument('--workers', type=int, default=2, help="процессов бота в режиме webhook")
+    parser.add_argument('--think', type=float, default=0.0, help="средняя пауза между шагами (секунды)")
+    args = parser.parse_args()
+
+    modes = ['polling', 'webhook'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        asyncio.run(LoadTest(mode, args.households, args.rounds, args.workers, args.think).run())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,42 @@
+import asyncio
 import logging
+import os
+import sqlite3
+import time
+# python-telegram-bot импортируется сразу (~250 мс из ~280 мс импорта bot):
+# без него процесс бота не может получить ни одного обновления, так что
+# отложенный импорт только перенес бы это время из импорта в run(), не сократив
+# время до ответа. Он нужен и для аннотаций Update/CallbackContext и для
+# ConversationHandler.END в обработчиках. По той же причине Application
+# создается в __init__: основное время сборки - загрузка сертификатов TLS
+# для клиентов httpx, без которых тоже не получить обновление. Лениво
+# грузятся numpy (analytics) и matplotlib (charts) - для первого ответа не нужны.
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import (
-    Application, CommandHandler, MessageHandler, 
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler,
     filters, CallbackContext, ConversationHandler
 )
 from database import Database
+from charts import ChartCache, render_breakdown, render_trend
+from currency import BASE_CURRENCY, RATES_FILE, RateNotFoundError, load_rates_file, parse_currency, parse_money
+from expense_parser import ExpenseParser
+from journal import ExpenseJournal
+from periods import WEEKDAY_NAMES, format_month
+from rendering import (
+    MAX_QUERY_LENGTH, PARSE_MODE, TITLE, TOTAL, category_expense_items, category_summary, escape_html,
+    expense_items, expense_report, short_description, split_blocks, truncate
+)
+from recurring import RecurringScheduler, PERIOD_ALIASES, PERIOD_WEEKLY
+from storage import create_storage_from_env
+from users import UserRegistry
+from maintenance import MaintenanceScheduler
 from keyboards import (
     get_main_keyboard, get_categories_keyboard, 
     get_statistics_keyboard, get_back_keyboard,
     get_settings_keyboard, get_detailed_stats_keyboard,  # Добавлено
-    get_categories_for_filter  # Добавлено
+    get_categories_for_filter,  # Добавлено
+    get_search_keyboard, get_expense_actions_keyboard, get_undo_keyboard
 )
-from config import BOT_TOKEN
 from datetime import datetime  # Добавлено
 
 # Настройка логирования
@@ -26,32 +51,138 @@ AMOUNT, CATEGORY, DESCRIPTION = range(3)
 # Добавим новые состояния для детализации
 DETAILED_STATS, DATE_RANGE, CATEGORY_FILTER = range(3, 6)
 
+# Сколько секунд можно отменить изменение или удаление расхода
+UNDO_SECONDS = 60
+
+# Количество процессов для рисования графиков
+CHART_WORKERS = 2
+
+# Сообщение, начинающееся с суммы, - быстрый ввод расхода одной строкой
+QUICK_EXPENSE_PATTERN = r"^\s*\d{1,9}(?:[.,]\d{1,2})?(?:\s|[₽€$₺]|$)"
+
+# Количество результатов поиска на одной странице
+SEARCH_PAGE_SIZE = 10
+
 class ExpenseBot:
-    def __init__(self, token):
-        self.application = Application.builder().token(token).build()
-        self.db = Database()
+    def __init__(self, token, storage=None, worker_index=0, worker_count=1, base_url=None):
+        builder = (
+            Application.builder()
+            .token(token)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+        )
+        # Другой адрес Bot API (локальный сервер Bot API или тестовый)
+        if base_url:
+            builder = builder.base_url(base_url)
+        self.application = builder.build()
+        # Номер процесса бота и их общее число (при работе через webhook_router.py)
+        self.worker_index = worker_index
+        self.worker_count = worker_count
+        self.db = Database(storage=storage)
+        self.users = UserRegistry(self.db)
+        # Новые расходы сначала пишутся в журнал и переносятся в базу в фоне
+        self.journal = ExpenseJournal(self.db, self.db.storage.journal_path(worker_index))
+        # Аналитика (numpy) и разбор расходов создаются при первом обращении
+        # или в фоне после запуска, чтобы не задерживать старт
+        self._analytics = None
+        self._parser = None
+        self.chart_cache = ChartCache()
+        self._chart_pool = None
+        self.recurring_scheduler = RecurringScheduler(self.db, worker_index, worker_count)
+        self.maintenance = MaintenanceScheduler(self.db)
+        self._background_tasks = []
         self.setup_handlers()
 
-    def _format_date(self, date_string):
-        """Вспомогательный метод для форматирования даты из базы данных"""
+    @property
+    def analytics(self):
+        """Аналитика расходов (модуль с numpy загружается при первом обращении)"""
+        if self._analytics is None:
+            from analytics import Analytics
+            self._analytics = Analytics(self.db)
+        return self._analytics
+
+    @property
+    def parser(self):
+        """Разбор расходов одной строкой (категории читаются из базы при первом обращении)"""
+        if self._parser is None:
+            self._parser = ExpenseParser(self.db.get_category_names())
+        return self._parser
+
+    def warm_up(self):
+        """Прогрев того, что не нужно для старта: пользователи, курсы валют, разбор расходов, аналитика"""
+        started = time.perf_counter()
+        self.users.load()
+        self.load_exchange_rates()
+        # Курсы в памяти: запись расхода в валюте не обращается к базе
+        self.db.load_exchange_rates()
+        # Обращение к свойствам создает объекты заранее
+        self.parser
+        self.analytics
+        logger.info("Прогрев завершен за %.2f с", time.perf_counter() - started)
+
+    def load_exchange_rates(self):
+        """Загрузка курсов валют из файла, если он есть. Возвращает число курсов"""
+        if not os.path.exists(RATES_FILE):
+            return 0
+        rates = load_rates_file(RATES_FILE)
+        self.db.save_exchange_rates(rates)
+        return len(rates)
+
+    async def _post_init(self, application):
+        """Запуск фоновых задач после инициализации бота"""
+        self._background_tasks.append(asyncio.create_task(asyncio.to_thread(self.warm_up)))
+        self._background_tasks.append(asyncio.create_task(self.recurring_scheduler.run()))
+        self._background_tasks.append(asyncio.create_task(self.users.run()))
+        self._background_tasks.append(asyncio.create_task(self.journal.run()))
+        # Обслуживание общих файлов базы достаточно выполнять в одном процессе
+        if self.worker_index == 0:
+            self._background_tasks.append(asyncio.create_task(self.maintenance.run()))
+
+    async def _post_shutdown(self, application):
+        """Освобождение ресурсов при остановке бота"""
+        for task in self._background_tasks:
+            task.cancel()
+        self._background_tasks.clear()
+        # Ошибка одного шага не должна мешать следующим
         try:
-            if '.' in date_string:
-                return datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S.%f').strftime('%d.%m.%Y')
-            else:
-                return datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
-        except ValueError:
-            return date_string.split()[0]       
+            self.users.flush()
+        except sqlite3.Error:
+            logger.warning("Время последних сообщений пользователей не записано в базу")
+        try:
+            self.journal.flush()
+        except sqlite3.Error:
+            logger.warning("Расходы из журнала будут перенесены в базу при следующем запуске")
+        if self._chart_pool is not None:
+            self._chart_pool.shutdown(wait=False, cancel_futures=True)
+            self._chart_pool = None
+
+    async def _send_messages(self, update: Update, messages, reply_markup):
+        """Отправка отчета из нескольких сообщений; клавиатура - у последнего"""
+        for message in messages[:-1]:
+            await update.message.reply_text(message, parse_mode=PARSE_MODE)
+        await update.message.reply_text(messages[-1], reply_markup=reply_markup, parse_mode=PARSE_MODE)
 
     def setup_handlers(self):
         """Настройка обработчиков команд"""
         
+        # Учет пользователей - раньше всех остальных обработчиков (группа -1)
+        self.application.add_handler(TypeHandler(Update, self.track_user), group=-1)
+        
         # Обработчики команд
         self.application.add_handler(CommandHandler("start", self.start))
         self.application.add_handler(CommandHandler("help", self.help_command))
+        self.application.add_handler(CommandHandler("search", self.search_command))
+        self.application.add_handler(CommandHandler("rates", self.show_rates))
+        self.application.add_handler(CommandHandler("recurring", self.show_recurring))
+        self.application.add_handler(CommandHandler("recurring_add", self.add_recurring))
+        self.application.add_handler(CommandHandler("recurring_del", self.delete_recurring))
         
         # ConversationHandler для добавления расходов
         conv_handler = ConversationHandler(
-            entry_points=[MessageHandler(filters.Regex("^💸 Добавить расход$"), self.start_add_expense)],
+            entry_points=[
+                MessageHandler(filters.Regex("^💸 Добавить расход$"), self.start_add_expense),
+                MessageHandler(filters.Regex(QUICK_EXPENSE_PATTERN), self.quick_add_expense),
+            ],
             states={
                 AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.get_amount)],
                 CATEGORY: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.get_category)],
@@ -67,6 +198,7 @@ class ExpenseBot:
         self.application.add_handler(MessageHandler(filters.Regex("^📆 Неделя$"), self.show_week_stats))
         self.application.add_handler(MessageHandler(filters.Regex("^📈 Месяц$"), self.show_month_stats))
         self.application.add_handler(MessageHandler(filters.Regex("^⚙️ Настройки$"), self.show_settings))
+        self.application.add_handler(MessageHandler(filters.Regex("^🔁 Регулярные$"), self.show_recurring))
         self.application.add_handler(MessageHandler(filters.Regex("^ℹ️ Помощь$"), self.help_command))
         self.application.add_handler(MessageHandler(filters.Regex("^↩️ Назад$"), self.back_to_main))
         
@@ -75,11 +207,32 @@ class ExpenseBot:
         self.application.add_handler(MessageHandler(filters.Regex("^📅 Неделя$"), self.show_week_detailed))
         self.application.add_handler(MessageHandler(filters.Regex("^📈 Месяц$"), self.show_month_detailed))
         
+        # Аналитика
+        self.application.add_handler(MessageHandler(filters.Regex("^📉 Тренды$"), self.show_trends))
+        self.application.add_handler(MessageHandler(filters.Regex("^👨‍👩‍👧 Тренды семьи$"), self.show_family_trends))
+        self.application.add_handler(MessageHandler(filters.Regex("^🗓 По дням недели$"), self.show_weekday_profile))
+        self.application.add_handler(MessageHandler(filters.Regex("^🥧 Доли категорий$"), self.show_category_shares))
+        
+        # Графики
+        self.application.add_handler(MessageHandler(filters.Regex("^🖼 Диаграмма недели$"), self.show_week_chart))
+        self.application.add_handler(MessageHandler(filters.Regex("^🖼 Диаграмма месяца$"), self.show_month_chart))
+        self.application.add_handler(MessageHandler(filters.Regex("^📈 График по месяцам$"), self.show_trend_chart))
+        
         # Добавляем обработчики для детализации
         self.application.add_handler(MessageHandler(filters.Regex("^📋 Детализация$"), self.show_detailed_stats_menu))
         self.application.add_handler(MessageHandler(filters.Regex("^📋 Все расходы$"), self.show_all_expenses))
         self.application.add_handler(MessageHandler(filters.Regex("^💰 Самые крупные$"), self.show_largest_expenses))
         self.application.add_handler(MessageHandler(filters.Regex("^↩️ Назад в статистику$"), self.back_to_statistics))
+        
+        # Полнотекстовый поиск по расходам
+        self.application.add_handler(MessageHandler(filters.Regex("^🔍 Поиск$"), self.ask_search_query))
+        self.application.add_handler(MessageHandler(filters.Regex("^➡️ Ещё результаты$"), self.show_more_search_results))
+
+        # Изменение и удаление последних расходов
+        self.application.add_handler(MessageHandler(filters.Regex("^🗂 Последние$"), self.show_recent_expenses))
+        self.application.add_handler(CallbackQueryHandler(self.edit_expense_callback, pattern=r"^exp_edit:\d+$"))
+        self.application.add_handler(CallbackQueryHandler(self.delete_expense_callback, pattern=r"^exp_del:\d+$"))
+        self.application.add_handler(CallbackQueryHandler(self.undo_callback, pattern=r"^exp_undo:\d+$"))
 
         # Убираем ConversationHandler и добавляем простые обработчики для даты и категории
         self.application.add_handler(MessageHandler(filters.Regex("^📅 По дате$"), self.ask_date_range))
@@ -91,17 +244,33 @@ class ExpenseBot:
             self.handle_detailed_input
         ))
 
+    @staticmethod
+    def _reset_awaiting(context):
+        """Сброс ожидания ответа (поиск, изменение расхода) при переходе по меню
+
+        Иначе следующий ввод, например выбор категории в фильтре, был бы
+        принят за поисковый запрос или новые данные расхода.
+        """
+        context.user_data.pop('awaiting', None)
+        context.user_data.pop('edit_id', None)
+
+    async def track_user(self, update: Update, context: CallbackContext):
+        """Отметка о сообщении пользователя; в базу пишется только смена имени"""
+        user = update.effective_user
+        if user is not None:
+            self.users.seen(user.id, user.username, user.first_name)
+
     async def start(self, update: Update, context: CallbackContext):
         """Обработчик команды /start"""
+        self._reset_awaiting(context)
         user = update.effective_user
-        self.db.add_user(user.id, user.username, user.first_name)
         
         welcome_text = f"""
-👋 Васап, {user.first_name}!
+👋 Васап, {escape_html(user.first_name)}!
 
 Я бот для учета твоих космических трат...
 
-📊 **Возможности:**
+📊 <b>Возможности:</b>
 • 💸 Быстрое добавление расходов
 • 📊 Статистика за день, неделю и месяц
 • 📈 Детализация по категориям
@@ -113,17 +282,48 @@ class ExpenseBot:
         await update.message.reply_text(
             welcome_text,
             reply_markup=get_main_keyboard(),
-            parse_mode='Markdown'
+            parse_mode=PARSE_MODE
         )
 
     async def start_add_expense(self, update: Update, context: CallbackContext):
         """Начало процесса добавления расхода"""
+        self._reset_awaiting(context)
         await update.message.reply_text(
             "💵 Введи сумму расхода:",
             reply_markup=get_back_keyboard()
         )
         return AMOUNT
 
+    async def quick_add_expense(self, update: Update, context: CallbackContext):
+        """Добавление расхода одним сообщением, например: 350 еда обед"""
+        # Пользователь отвечает на другой вопрос бота (поиск, изменение расхода)
+        if context.user_data.get('awaiting'):
+            await self.handle_detailed_input(update, context)
+            return ConversationHandler.END
+        
+        parsed = self.parser.parse(update.message.text)
+        # Сумму разобрать не удалось - продолжаем обычный диалог с ввода суммы
+        if parsed is None or parsed.amount is None or parsed.amount <= 0:
+            await update.message.reply_text(
+                "💵 Не понял, какая сумма. Введи сумму расхода:",
+                reply_markup=get_back_keyboard()
+            )
+            return AMOUNT
+        
+        context.user_data['amount'] = parsed.amount
+        context.user_data['currency'] = parsed.currency
+        
+        # Категорию не узнали - продолжаем обычный диалог с выбора категории
+        if parsed.category is None:
+            await update.message.reply_text(
+                f"💵 Сумма: {parsed.amount} {parsed.currency}\n📁 Выбери категорию:",
+                reply_markup=get_categories_keyboard()
+            )
+            return CATEGORY
+        
+        context.user_data['category'] = parsed.category
+        return await self._save_expense(update, context, parsed.description)
+
     async def get_amount(self, update: Update, context: CallbackContext):
         """Получение суммы расхода"""
         user_input = update.message.text
@@ -138,12 +338,13 @@ class ExpenseBot:
             return ConversationHandler.END
         
         try:
-            amount = float(user_input.replace(',', '.'))
+            amount, currency = parse_money(user_input)
             if amount <= 0:
                 await update.message.reply_text("❌ Сумма должна быть положительной. Попробуй снова:")
                 return AMOUNT
             
             context.user_data['amount'] = amount
+            context.user_data['currency'] = currency
             await update.message.reply_text(
                 "📁 Выбери категорию:",
                 reply_markup=get_categories_keyboard()
@@ -151,7 +352,7 @@ class ExpenseBot:
             return CATEGORY
         
         except ValueError:
-            await update.message.reply_text("❌ Пожалуйста, введи корректную сумму (например: 150.50):")
+            await update.message.reply_text("❌ Пожалуйста, введи корректную сумму (например: 150.50 или 10 eur):")
             return AMOUNT
 
     async def get_category(self, update: Update, context: CallbackContext):
@@ -188,18 +389,46 @@ class ExpenseBot:
         if description == "Пропустить":
             description = ""
         
+        return await self._save_expense(update, context, description)
+
+    async def _save_expense(self, update: Update, context: CallbackContext, description):
+        """Сохранение расхода из context.user_data и завершение диалога"""
         # Сохраняем расход в базу
         user_id = update.effective_user.id
         amount = context.user_data['amount']
         category = context.user_data['category']
+        currency = context.user_data.get('currency', BASE_CURRENCY)
         
-        self.db.add_expense(user_id, amount, category, description)
+        try:
+            base_amount = await asyncio.to_thread(
+                self.journal.add, user_id, amount, category, description, currency
+            )
+        except RateNotFoundError:
+            await update.message.reply_text(
+                f"❌ Нет курса {currency}. Добавь его в {RATES_FILE} и выполни /rates",
+                reply_markup=get_main_keyboard()
+            )
+            context.user_data.clear()
+            return ConversationHandler.END
+        except (sqlite3.Error, OSError):
+            logger.exception("Не удалось записать расход")
+            await update.message.reply_text(
+                "❌ Не удалось сохранить расход, попробуй еще раз",
+                reply_markup=get_main_keyboard()
+            )
+            context.user_data.clear()
+            return ConversationHandler.END
+        
+        if currency == BASE_CURRENCY:
+            amount_text = f"{amount} руб."
+        else:
+            amount_text = f"{amount} {currency} (≈ {base_amount:.2f} руб.)"
         
         # Формируем сообщение о успешном добавлении
         message = f"""
 ✅ Расход добавлен!
 
-💵 Сумма: {amount} руб.
+💵 Сумма: {amount_text}
 📁 Категория: {category}
 📝 Описание: {description if description else "не указано"}
         """
@@ -224,6 +453,7 @@ class ExpenseBot:
 
     async def show_statistics_menu(self, update: Update, context: CallbackContext):
         """Показ меню статистики"""
+        self._reset_awaiting(context)
         await update.message.reply_text(
             "📊 Выбери тип статистики:",
             reply_markup=get_statistics_keyboard()
@@ -231,71 +461,42 @@ class ExpenseBot:
 
     async def show_today_stats(self, update: Update, context: CallbackContext):
         """Показ статистики за сегодня"""
+        self._reset_awaiting(context)
         user_id = update.effective_user.id
         total = self.db.get_total_today(user_id)
         expenses = self.db.get_today_expenses(user_id)
         
-        message = f"📊 **Расходы за сегодня**\n\n"
-        message += f"💵 **Общая сумма:** {total:.2f} руб.\n\n"
-        
-        if expenses:
-            message += "**По категориям:**\n"
-            for category, amount in expenses:
-                message += f"• {category}: {amount:.2f} руб.\n"
-        else:
-            message += "📝 Расходов за сегодня нет"
-        
-        await update.message.reply_text(
-            message,
-            reply_markup=get_main_keyboard(),
-            parse_mode='Markdown'
+        messages = category_summary(
+            "📊 Расходы за сегодня", total, expenses,
+            "📝 Расходов за сегодня нет", with_share=False
         )
+        await self._send_messages(update, messages, get_main_keyboard())
 
     async def show_week_stats(self, update: Update, context: CallbackContext):
         """Показ статистики за неделю"""
+        self._reset_awaiting(context)
         user_id = update.effective_user.id
         total = self.db.get_total_week(user_id)
         expenses = self.db.get_week_expenses(user_id)
         
-        message = f"📅 **Расходы за текущую неделю**\n\n"
-        message += f"💵 **Общая сумма:** {total:.2f} руб.\n\n"
-        
-        if expenses:
-            message += "**По категориям:**\n"
-            for category, amount in expenses:
-                percentage = (amount / total) * 100 if total > 0 else 0
-                message += f"• {category}: {amount:.2f} руб. ({percentage:.1f}%)\n"
-        else:
-            message += "📝 Расходов за неделю нет"
-        
-        await update.message.reply_text(
-            message,
-            reply_markup=get_main_keyboard(),
-            parse_mode='Markdown'
+        messages = category_summary(
+            "📅 Расходы за текущую неделю", total, expenses,
+            "📝 Расходов за неделю нет"
         )
+        await self._send_messages(update, messages, get_main_keyboard())
 
     async def show_month_stats(self, update: Update, context: CallbackContext):
         """Показ статистики за месяц"""
+        self._reset_awaiting(context)
         user_id = update.effective_user.id
         total = self.db.get_total_month(user_id)
         expenses = self.db.get_month_expenses(user_id)
         
-        message = f"📈 **Расходы за текущий месяц**\n\n"
-        message += f"💵 **Общая сумма:** {total:.2f} руб.\n\n"
-        
-        if expenses:
-            message += "**По категориям:**\n"
-            for category, amount in expenses:
-                percentage = (amount / total) * 100 if total > 0 else 0
-                message += f"• {category}: {amount:.2f} руб. ({percentage:.1f}%)\n"
-        else:
-            message += "📝 Расходов за месяц нет"
-        
-        await update.message.reply_text(
-            message,
-            reply_markup=get_main_keyboard(),
-            parse_mode='Markdown'
+        messages = category_summary(
+            "📈 Расходы за текущий месяц", total, expenses,
+            "📝 Расходов за месяц нет"
         )
+        await self._send_messages(update, messages, get_main_keyboard())
 
     async def show_today_detailed(self, update: Update, context: CallbackContext):
         """Детальная статистика за сегодня"""
@@ -309,19 +510,166 @@ class ExpenseBot:
         """Детальная статистика за месяц"""
         await self.show_month_stats(update, context)
 
+    # АНАЛИТИКА
+
+    async def show_trends(self, update: Update, context: CallbackContext):
+        """Тренды расходов пользователя"""
+        self._reset_awaiting(context)
+        await self._send_trends(update, update.effective_user.id, "📉 <b>Тренды расходов</b>")
+
+    async def show_family_trends(self, update: Update, context: CallbackContext):
+        """Тренды расходов всей семьи"""
+        self._reset_awaiting(context)
+        members = self.db.storage.household_members(update.effective_user.id)
+        await self._send_trends(update, members, "👨‍👩‍👧 <b>Тренды расходов семьи</b>")
+
+    async def _send_trends(self, update: Update, user_id, title):
+        """Изменения по месяцам и скользящие средние"""
+        # Загрузка ряда из базы после изменения данных занимает заметное время,
+        # поэтому аналитика считается в потоке, а не в цикле событий
+        months, totals, deltas = await asyncio.to_thread(self.analytics.month_over_month, user_id)
+        averages = await asyncio.to_thread(self.analytics.moving_averages, user_id)
+        
+        lines = [f"{title}\n\n<b>По месяцам:</b>\n"]
+        for month, total, delta in zip(months, totals, deltas):
+            change = f" ({delta:+.1f}%)" if delta == delta else ""
+            lines.append(f"• {format_month(month)}: {total:.2f} руб.{change}\n")
+        
+        lines.append("\n<b>Среднее в месяц:</b>\n")
+        for window, average in averages.items():
+            lines.append(f"• за {window} мес.: {average:.2f} руб.\n")
+        
+        await self._send_messages(update, split_blocks(lines), get_statistics_keyboard())
+
+    async def show_weekday_profile(self, update: Update, context: CallbackContext):
+        """Средние расходы по дням недели"""
+        self._reset_awaiting(context)
+        profile = await asyncio.to_thread(self.analytics.weekday_profile, update.effective_user.id)
+        peak = profile.max()
+        
+        lines = ["🗓 <b>Средние расходы по дням недели</b>\n\n"]
+        for name, average in zip(WEEKDAY_NAMES, profile):
+            bar = "▇" * int(round(average / peak * 10)) if peak > 0 else ""
+            lines.append(f"{name}: {average:.2f} руб. {bar}\n")
+        
+        await update.message.reply_text(
+            ''.join(lines),
+            reply_markup=get_statistics_keyboard(),
+            parse_mode=PARSE_MODE
+        )
+
+    async def show_category_shares(self, update: Update, context: CallbackContext):
+        """Изменение долей категорий: текущий месяц против среднего за прошлые"""
+        self._reset_awaiting(context)
+        months, categories, shares = await asyncio.to_thread(
+            self.analytics.category_share_trend, update.effective_user.id
+        )
+        
+        if not categories:
+            await update.message.reply_text(
+                "📝 У вас пока нет записей о расходах",
+                reply_markup=get_statistics_keyboard()
+            )
+            return
+        
+        current = shares[-1]
+        previous = shares[:-1].mean(axis=0)
+        
+        lines = [f"🥧 <b>Доли категорий</b>\n"
+                 f"{format_month(months[-1])} против среднего за {len(months) - 1} мес.\n\n"]
+        for index in current.argsort()[::-1]:
+            if current[index] == 0 and previous[index] == 0:
+                continue
+            lines.append(f"• {escape_html(categories[index])}: {current[index]:.1f}% "
+                         f"({current[index] - previous[index]:+.1f} п.п.)\n")
+        
+        await self._send_messages(update, split_blocks(lines), get_statistics_keyboard())
+
+    # ГРАФИКИ
+
+    async def show_week_chart(self, update: Update, context: CallbackContext):
+        """Диаграмма расходов за неделю"""
+        self._reset_awaiting(context)
+        user_id = update.effective_user.id
+        year, week, _ = datetime.now().isocalendar()
+        await self._send_breakdown_chart(
+            update, user_id, f"week:{year}-{week}",
+            "Расходы за текущую неделю", self.db.get_week_expenses(user_id)
+        )
+
+    async def show_month_chart(self, update: Update, context: CallbackContext):
+        """Диаграмма расходов за месяц"""
+        self._reset_awaiting(context)
+        user_id = update.effective_user.id
+        await self._send_breakdown_chart(
+            update, user_id, f"month:{datetime.now():%Y-%m}",
+            "Расходы за текущий месяц", self.db.get_month_expenses(user_id)
+        )
+
+    async def show_trend_chart(self, update: Update, context: CallbackContext):
+        """График расходов по месяцам за год"""
+        self._reset_awaiting(context)
+        user_id = update.effective_user.id
+        months, totals = await asyncio.to_thread(self.analytics.monthly_totals, user_id)
+        labels = [format_month(month) for month in months]
+        await self._send_chart(
+            update, user_id, f"trend:{datetime.now():%Y-%m}",
+            render_trend, "Расходы по месяцам", labels, [float(total) for total in totals]
+        )
+
+    async def _send_breakdown_chart(self, update: Update, user_id, period, title, expenses):
+        """Диаграмма по категориям или сообщение об отсутствии расходов"""
+        if not expenses:
+            await update.message.reply_text(
+                "📝 Расходов за этот период нет",
+                reply_markup=get_statistics_keyboard()
+            )
+            return
+        
+        expenses = sorted(expenses, key=lambda item: item[1], reverse=True)
+        labels = [category for category, _ in expenses]
+        values = [amount for _, amount in expenses]
+        await self._send_chart(update, user_id, period, render_breakdown, title, labels, values)
+
+    async def _send_chart(self, update: Update, user_id, period, render, *render_args):
+        """Отправка графика: из кэша file_id или после отрисовки в отдельном процессе"""
+        key = (user_id, period, self.db.get_data_version(user_id))
+        file_id = self.chart_cache.get(key)
+        if file_id is not None:
+            await update.message.reply_photo(photo=file_id, reply_markup=get_statistics_keyboard())
+            return
+        
+        if self._chart_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # fork из процесса, где уже работают потоки (to_thread, прогрев), небезопасен:
+            # процессы для графиков запускаются через forkserver (или spawn, где его нет)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._chart_pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=context)
+        
+        # Рисование занимает сотни миллисекунд - не блокируем цикл событий
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(self._chart_pool, render, *render_args)
+        
+        message = await update.message.reply_photo(photo=png, reply_markup=get_statistics_keyboard())
+        self.chart_cache.put(key, message.photo[-1].file_id)
+
     # НОВЫЕ МЕТОДЫ ДЛЯ ДЕТАЛИЗАЦИИ
 
     async def show_detailed_stats_menu(self, update: Update, context: CallbackContext):
         """Показ меню детализированной статистики"""
+        self._reset_awaiting(context)
         await update.message.reply_text(
-            "📋 **Детализированная статистика**\n\n"
+            "📋 <b>Детализированная статистика</b>\n\n"
             "Выберите тип отчета:",
             reply_markup=get_detailed_stats_keyboard(),
-            parse_mode='Markdown'
+            parse_mode=PARSE_MODE
         )
 
     async def show_all_expenses(self, update: Update, context: CallbackContext):
         """Показ всех расходов"""
+        self._reset_awaiting(context)
         user_id = update.effective_user.id
         expenses = self.db.get_all_expenses(user_id)
         
@@ -332,51 +680,153 @@ class ExpenseBot:
             )
             return
         
-        message = "📋 **Все расходы**\n\n"
-        total = 0
-        
-        for i, (category, amount, description, date) in enumerate(expenses, 1):
-            total += amount
-            #Исправляем парсинг даты с микросекундами
-            try:
-                # Пробуем разные форматы даты
-                if '.' in date:
-                    # Формат с микросекундами: 2024-01-01 12:00:00.123456
-                    date_str = datetime.strptime(date, '%Y-%m-%d %H:%M:%S.%f').strftime('%d.%m.%Y')
-                else:
-                    # Формат без микросекунд: 2024-01-01 12:00:00
-                    date_str = datetime.strptime(date, '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
-            except ValueError:
-                # Если не получается распарсить, используем исходную дату
-                date_str = date.split()[0]  # Берем только дату без времени
+        messages = expense_report("📋 Все расходы", expenses)
+        await self._send_messages(update, messages, get_detailed_stats_keyboard())
 
-            desc = description if description else "без описания"
-            message += f"{i}. **{category}** - {amount:.2f} руб.\n"
-            message += f"   📅 {date_str} | 📝 {desc}\n\n"
+    async def show_recent_expenses(self, update: Update, context: CallbackContext):
+        """Последние расходы с кнопками изменения и удаления"""
+        self._reset_awaiting(context)
+        user_id = update.effective_user.id
+        expenses = self.db.get_recent_expenses(user_id)
+        
+        if not expenses:
+            await update.message.reply_text(
+                "📝 У вас пока нет записей о расходах",
+                reply_markup=get_detailed_stats_keyboard()
+            )
+            return
+        
+        blocks = [TITLE("🗂 Последние расходы")]
+        blocks.extend(expense_items(expense[1:] for expense in expenses))
+        blocks.append("✏️ - изменить, 🗑 - удалить")
+        
+        await self._send_messages(
+            update, split_blocks(blocks),
+            get_expense_actions_keyboard([expense[0] for expense in expenses])
+        )
 
-        message += f"💵 **Итого:** {total:.2f} руб.\n"
-        message += f"📊 **Всего записей:** {len(expenses)}"
+    async def edit_expense_callback(self, update: Update, context: CallbackContext):
+        """Нажатие кнопки изменения расхода"""
+        query = update.callback_query
+        await query.answer()
+        
+        context.user_data['awaiting'] = 'edit'
+        context.user_data['edit_id'] = int(query.data.split(':')[1])
+        await query.message.reply_text(
+            "✏️ Введи новую сумму и, если нужно, описание.\n"
+            "Например: 350 обед в кафе",
+            reply_markup=get_back_keyboard()
+        )
 
-        # Разбиваем сообщение если оно слишком длинное
-        if len(message) > 4000:
-            parts = [message[i:i+4000] for i in range(0, len(message), 4000)]
-            for part in parts:
-                await update.message.reply_text(part, parse_mode='Markdown')
-        else:
+    async def process_edit(self, update: Update, context: CallbackContext, user_input):
+        """Сохранение измененного расхода"""
+        # Сумма может быть в валюте: "12 eur кофе", "12€ кофе"
+        words = user_input.split(maxsplit=2)
+        money_words = 2 if len(words) > 1 and parse_currency(words[1]) else 1
+        description = ' '.join(words[money_words:])
+        try:
+            amount, currency = parse_money(' '.join(words[:money_words]))
+        except ValueError:
+            amount, currency = 0, BASE_CURRENCY
+        if amount <= 0:
+            await update.message.reply_text("❌ Введи положительную сумму (например: 350 обед):")
+            return
+        
+        context.user_data.pop('awaiting', None)
+        expense_id = context.user_data.pop('edit_id')
+        try:
+            old_row = self.db.update_expense(
+                expense_id, update.effective_user.id, amount=amount,
+                description=description.strip() or None, currency=currency
+            )
+        except RateNotFoundError:
             await update.message.reply_text(
-                message,
-                reply_markup=get_detailed_stats_keyboard(),
-                parse_mode='Markdown'
+                f"❌ Нет курса {currency}. Добавь его в {RATES_FILE} и выполни /rates",
+                reply_markup=get_detailed_stats_keyboard()
             )
+            return
+        
+        if old_row is None:
+            await update.message.reply_text(
+                "❌ Расход не найден - возможно, он уже удален",
+                reply_markup=get_detailed_stats_keyboard()
+            )
+            return
+        
+        new_amount = f"{amount:.2f} руб." if currency == BASE_CURRENCY else f"{amount} {currency}"
+        action_id = self._remember_undo(context, 'update', old_row)
+        await update.message.reply_text(
+            f"✅ Расход изменен: {old_row[2]:.2f} руб. → {new_amount}",
+            reply_markup=get_undo_keyboard(action_id)
+        )
+        await update.message.reply_text("📋 Выберите тип отчета:", reply_markup=get_detailed_stats_keyboard())
+
+    async def delete_expense_callback(self, update: Update, context: CallbackContext):
+        """Нажатие кнопки удаления расхода"""
+        query = update.callback_query
+        expense_id = int(query.data.split(':')[1])
+        old_row = self.db.delete_expense(expense_id, update.effective_user.id)
+        
+        if old_row is None:
+            await query.answer("Расход уже удален")
+            return
+        
+        await query.answer()
+        action_id = self._remember_undo(context, 'delete', old_row)
+        await query.message.reply_text(
+            f"🗑 Удален расход: {old_row[3]} - {old_row[2]:.2f} руб.",
+            reply_markup=get_undo_keyboard(action_id)
+        )
+
+    def _remember_undo(self, context: CallbackContext, action, old_row):
+        """Запоминаем изменение для отмены. Возвращает номер действия для кнопки"""
+        now = time.monotonic()
+        # Номер действия -> запись; просроченные записи выбрасываем
+        undo = {
+            action_id: entry for action_id, entry in context.user_data.get('undo', {}).items()
+            if entry['expires'] > now
+        }
+        action_id = context.user_data.get('undo_last_id', 0) + 1
+        context.user_data['undo_last_id'] = action_id
+        undo[action_id] = {
+            'action': action,
+            'row': old_row,
+            'expires': now + UNDO_SECONDS,
+        }
+        context.user_data['undo'] = undo
+        return action_id
+
+    async def undo_callback(self, update: Update, context: CallbackContext):
+        """Отмена изменения или удаления, к которому относится кнопка"""
+        query = update.callback_query
+        action_id = int(query.data.split(':')[1])
+        # Забираем запись сразу, чтобы повторное нажатие ничего не делало
+        undo = context.user_data.get('undo', {}).pop(action_id, None)
+        
+        if undo is None or time.monotonic() > undo['expires']:
+            await query.answer("Отменить уже нельзя", show_alert=True)
+            return
+        
+        row = undo['row']
+        if undo['action'] == 'delete':
+            self.db.restore_expense(row)
+        else:
+            self.db.revert_expense(row)
+        
+        await query.answer("Изменение отменено")
+        await query.edit_message_reply_markup(reply_markup=None)
+        await query.message.reply_text("↩️ Изменение отменено")
 
     async def ask_date_range(self, update: Update, context: CallbackContext):
         """Запрос периода дат"""
+        self._reset_awaiting(context)
         await update.message.reply_text(
-            "📅 **Введите период в формате:**\n"
-            "**ДД.ММ.ГГГГ-ДД.ММ.ГГГГ**\n\n"
+            "📅 <b>Введите период в формате:</b>\n"
+            "<b>ДД.ММ.ГГГГ-ДД.ММ.ГГГГ</b>\n\n"
             "Например: 01.12.2024-15.12.2024\n"
             "Или введите 'месяц' для текущего месяца",
-            reply_markup=get_back_keyboard()
+            reply_markup=get_back_keyboard(),
+            parse_mode=PARSE_MODE
         )
 
     async def process_date_range(self, update: Update, context: CallbackContext):
@@ -414,30 +864,16 @@ class ExpenseBot:
             )
             return
         
-        message = f"📅 **Расходы {period_text}**\n\n"
-        total = 0
-        
-        for i, (category, amount, description, date) in enumerate(expenses, 1):
-            total += amount
-            date_str = self._format_date(date)
-            desc = description if description else "без описания"
-            message += f"{i}. **{category}** - {amount:.2f} руб.\n"
-            message += f"   📅 {date_str} | 📝 {desc}\n\n"
-        
-        message += f"💵 **Итого:** {total:.2f} руб.\n"
-        message += f"📊 **Всего записей:** {len(expenses)}"
-        
-        await update.message.reply_text(
-            message,
-            reply_markup=get_detailed_stats_keyboard(),
-            parse_mode='Markdown'
-        )
+        messages = expense_report(f"📅 Расходы {period_text}", expenses)
+        await self._send_messages(update, messages, get_detailed_stats_keyboard())
 
     async def ask_category_filter(self, update: Update, context: CallbackContext):
         """Запрос категории для фильтрации"""
+        self._reset_awaiting(context)
         await update.message.reply_text(
-            "📁 **Выберите категорию для фильтрации:**",
-            reply_markup=get_categories_for_filter()
+            "📁 <b>Выберите категорию для фильтрации:</b>",
+            reply_markup=get_categories_for_filter(),
+            parse_mode=PARSE_MODE
         )
 
     async def process_category_filter(self, update: Update, context: CallbackContext):
@@ -468,27 +904,15 @@ class ExpenseBot:
             )
             return
         
-        message = f"📁 **Расходы по категории: {category_input}**\n\n"
-        total = 0
-        
-        for i, (category, amount, description, date) in enumerate(expenses, 1):
-            total += amount
-            date_str = self._format_date(date)
-            desc = description if description else "без описания"
-            message += f"{i}. {amount:.2f} руб. | 📅 {date_str}\n"
-            message += f"   📝 {desc}\n\n"
-        
-        message += f"💵 **Итого по категории:** {total:.2f} руб.\n"
-        message += f"📊 **Всего записей:** {len(expenses)}"
-        
-        await update.message.reply_text(
-            message,
-            reply_markup=get_detailed_stats_keyboard(),
-            parse_mode='Markdown'
+        messages = expense_report(
+            f"📁 Расходы по категории: {category_input}", expenses,
+            total_label="Итого по категории", items=category_expense_items
         )
+        await self._send_messages(update, messages, get_detailed_stats_keyboard())
 
     async def show_largest_expenses(self, update: Update, context: CallbackContext):
         """Показ самых крупных расходов"""
+        self._reset_awaiting(context)
         user_id = update.effective_user.id
         expenses = self.db.get_largest_expenses(user_id)
         
@@ -499,35 +923,81 @@ class ExpenseBot:
             )
             return
         
-        message = "💰 **Самые крупные расходы**\n\n"
-        total = 0
+        blocks = [TITLE("💰 Самые крупные расходы")]
+        blocks.extend(expense_items(expenses))
+        total = sum(expense[1] for expense in expenses)
+        blocks.append(TOTAL(f"Сумма топ-{len(expenses)} расходов", total))
         
-        for i, (category, amount, description, date) in enumerate(expenses, 1):
-            total += amount
+        await self._send_messages(update, split_blocks(blocks), get_detailed_stats_keyboard())
 
-            # Исправленный парсинг даты с микросекундами
-            try:
-                if '.' in date:
-                    date_str = datetime.strptime(date, '%Y-%m-%d %H:%M:%S.%f').strftime('%d.%m.%Y')
-                else:
-                    date_str = datetime.strptime(date, '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
-            except ValueError:
-                date_str = date.split()[0]  # Берем только дату без времени
+    async def ask_search_query(self, update: Update, context: CallbackContext):
+        """Запрос текста для поиска"""
+        self._reset_awaiting(context)
+        context.user_data['awaiting'] = 'search'
+        await update.message.reply_text(
+            "🔍 <b>Что ищем?</b>\n\n"
+            "Введите слова из описания или категории, например: ремонт машины",
+            reply_markup=get_back_keyboard(),
+            parse_mode=PARSE_MODE
+        )
 
-            desc = description if description else "без описания"
-            message += f"{i}. **{category}** - {amount:.2f} руб.\n"
-            message += f"   📅 {date_str} | 📝 {desc}\n\n"
+    async def search_command(self, update: Update, context: CallbackContext):
+        """Обработчик команды /search <запрос>"""
+        self._reset_awaiting(context)
+        if not context.args:
+            await self.ask_search_query(update, context)
+            return
+        await self.process_search(update, context, ' '.join(context.args))
 
-        message += f"💵 **Сумма топ-{len(expenses)} расходов:** {total:.2f} руб."
+    async def process_search(self, update: Update, context: CallbackContext, query):
+        """Поиск расходов и показ первой страницы результатов"""
+        context.user_data.pop('awaiting', None)
+        context.user_data['search_query'] = query
+        context.user_data['search_offset'] = 0
+        await self.show_search_page(update, context)
 
-        await update.message.reply_text(
-            message,
-            reply_markup=get_detailed_stats_keyboard(),
-            parse_mode='Markdown'
-        )
+    async def show_more_search_results(self, update: Update, context: CallbackContext):
+        """Показ следующей страницы результатов поиска"""
+        if 'search_query' not in context.user_data:
+            await self.ask_search_query(update, context)
+            return
+        context.user_data['search_offset'] += SEARCH_PAGE_SIZE
+        await self.show_search_page(update, context)
+
+    async def show_search_page(self, update: Update, context: CallbackContext):
+        """Показ страницы результатов поиска"""
+        user_id = update.effective_user.id
+        query = context.user_data['search_query']
+        offset = context.user_data['search_offset']
+        
+        # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+        expenses = self.db.search_expenses(user_id, query, SEARCH_PAGE_SIZE + 1, offset)
+        has_more = len(expenses) > SEARCH_PAGE_SIZE
+        expenses = expenses[:SEARCH_PAGE_SIZE]
+        
+        if not expenses:
+            context.user_data.pop('search_query', None)
+            if offset == 0:
+                text = f"📝 По запросу '{truncate(query, MAX_QUERY_LENGTH)}' ничего не найдено"
+            else:
+                text = "📝 Больше результатов нет"
+            await update.message.reply_text(text, reply_markup=get_detailed_stats_keyboard())
+            return
+        
+        blocks = [TITLE(f"🔍 Результаты поиска: {escape_html(truncate(query, MAX_QUERY_LENGTH))}")]
+        blocks.extend(expense_items(expenses, offset + 1))
+        
+        if has_more:
+            reply_markup = get_search_keyboard()
+        else:
+            context.user_data.pop('search_query', None)
+            reply_markup = get_detailed_stats_keyboard()
+        
+        await self._send_messages(update, split_blocks(blocks), reply_markup)
 
     async def back_to_statistics(self, update: Update, context: CallbackContext):
         """Возврат в меню статистики"""
+        self._reset_awaiting(context)
         await update.message.reply_text(
             "📊 Выбери тип статистики:",
             reply_markup=get_statistics_keyboard()
@@ -535,18 +1005,127 @@ class ExpenseBot:
 
     async def show_settings(self, update: Update, context: CallbackContext):
         """Показ настроек"""
+        self._reset_awaiting(context)
         await update.message.reply_text(
             "⚙️ **Настройки**\n\nЗдесь ты можешь настроить бота под себя",
             reply_markup=get_settings_keyboard(),
             parse_mode='Markdown'
         )
 
+    async def show_rates(self, update: Update, context: CallbackContext):
+        """Обработчик команды /rates: перечитать файл курсов и показать текущие курсы"""
+        self._reset_awaiting(context)
+        loaded = self.load_exchange_rates()
+        rates = self.db.get_latest_exchange_rates()
+        
+        message = f"💱 Курсы валют (файл {RATES_FILE}, прочитано: {loaded})\n\n"
+        if rates:
+            for currency, day, rate in rates:
+                message += f"• 1 {currency} = {rate:.4f} руб. (на {day})\n"
+        else:
+            message += "📝 Курсов пока нет. Формат строки файла: EUR,2024-12-01,100.5"
+        
+        await update.message.reply_text(message, reply_markup=get_main_keyboard())
+
+    # РЕГУЛЯРНЫЕ РАСХОДЫ
+
+    async def show_recurring(self, update: Update, context: CallbackContext):
+        """Список регулярных расходов"""
+        self._reset_awaiting(context)
+        rules = self.db.get_recurring_expenses(update.effective_user.id)
+        
+        blocks = [TITLE("🔁 Регулярные расходы")]
+        if rules:
+            for rule_id, amount, category, description, period, anchor_day in rules:
+                if period == PERIOD_WEEKLY:
+                    schedule = f"каждый {WEEKDAY_NAMES[anchor_day]}"
+                else:
+                    schedule = f"каждое {anchor_day} число"
+                desc = f" ({short_description(description)})" if description else ""
+                blocks.append(f"#{rule_id} <b>{escape_html(category)}</b>{desc} - {amount:.2f} руб., {schedule}\n")
+        else:
+            blocks.append("📝 Регулярных расходов пока нет\n")
+        
+        blocks.append(
+            "\n<b>Добавить:</b> /recurring_add сумма период день категория [описание]\n"
+            "период - месяц или неделя, день - число месяца (1-31) или день недели (1-7)\n"
+            "Например: /recurring_add 15000 месяц 5 Дом Аренда\n"
+            "<b>Удалить:</b> /recurring_del номер"
+        )
+        
+        await self._send_messages(update, split_blocks(blocks), get_settings_keyboard())
+
+    async def add_recurring(self, update: Update, context: CallbackContext):
+        """Обработчик команды /recurring_add"""
+        args = context.args
+        try:
+            amount, currency = parse_money(args[0])
+            if currency != BASE_CURRENCY:
+                raise ValueError("Регулярные расходы - только в базовой валюте")
+            period = PERIOD_ALIASES[args[1].lower()]
+            anchor_day = int(args[2])
+            category = args[3]
+        except (IndexError, KeyError, ValueError):
+            await update.message.reply_text(
+                "❌ Формат: /recurring_add сумма период день категория [описание]\n"
+                "Например: /recurring_add 15000 месяц 5 Дом Аренда"
+            )
+            return
+        
+        max_day = 7 if period == PERIOD_WEEKLY else 31
+        if amount <= 0 or not 1 <= anchor_day <= max_day:
+            await update.message.reply_text(f"❌ Сумма должна быть положительной, а день - от 1 до {max_day}")
+            return
+        
+        # Только существующие категории: иначе расходы не видны в фильтрах и меню
+        names = {name.lower(): name for name in self.db.get_category_names()}
+        category = names.get(category.lower())
+        if category is None:
+            await update.message.reply_text(
+                "❌ Нет такой категории. Доступные: " + ", ".join(names.values())
+            )
+            return
+        
+        # Дни недели пользователь вводит с 1 (понедельник), в базе храним с 0
+        if period == PERIOD_WEEKLY:
+            anchor_day -= 1
+        
+        description = ' '.join(args[4:])
+        rule_id = self.db.add_recurring_expense(
+            update.effective_user.id, amount, category, description, period, anchor_day
+        )
+        # Сразу создаем расход, если день платежа - сегодня
+        await asyncio.to_thread(
+            self.db.materialize_recurring_expenses, None, self.worker_index, self.worker_count
+        )
+        
+        await update.message.reply_text(f"✅ Регулярный расход #{rule_id} добавлен")
+
+    async def delete_recurring(self, update: Update, context: CallbackContext):
+        """Обработчик команды /recurring_del"""
+        try:
+            rule_id = int(context.args[0].lstrip('#'))
+        except (IndexError, ValueError):
+            await update.message.reply_text("❌ Формат: /recurring_del номер")
+            return
+        
+        if self.db.delete_recurring_expense(rule_id, update.effective_user.id):
+            await update.message.reply_text(f"🗑 Регулярный расход #{rule_id} удален")
+        else:
+            await update.message.reply_text(f"❌ Регулярный расход #{rule_id} не найден")
+
     async def handle_detailed_input(self, update: Update, context: CallbackContext):
         """Обработка ввода для детализированной статистики"""
         user_input = update.message.text.strip()
 
+        # Ожидаем текст поискового запроса
+        if context.user_data.get('awaiting') == 'search':
+            await self.process_search(update, context, user_input)
+        # Ожидаем новые данные изменяемого расхода
+        elif context.user_data.get('awaiting') == 'edit':
+            await self.process_edit(update, context, user_input)
         # Проверяем, является ли ввод периодом дат (формат ДД.ММ.ГГГГ-ДД.ММ.ГГГГ)
-        if self._is_date_period(user_input):
+        elif self._is_date_period(user_input):
             await self.process_date_range(update, context)
         # Проверяем, является ли ввод категорией (содержит эмодзи)
         elif any(char in user_input for char in ['🍔', '⛽️', '🏠', '👗', '💊', '🍺', '📱', '💡', '🎁', '💸', '🚬', '🐈']):
@@ -597,6 +1176,7 @@ class ExpenseBot:
 
     async def help_command(self, update: Update, context: CallbackContext):
         """Показ помощи"""
+        self._reset_awaiting(context)
         help_text = """
 ℹ️ **Помощь по боту**
 
@@ -607,6 +1187,9 @@ class ExpenseBot:
 • 📆 Неделя - расходы за текущую неделю
 • 📈 Месяц - расходы за текущий месяц
 • 📋 Детализация - подробные отчеты по расходам
+• 📉 Тренды - динамика по месяцам и средние расходы
+• 🔍 Поиск или /search <слова> - поиск по описаниям расходов
+• 🔁 Регулярные (в настройках) - аренда, связь и другие ежемесячные платежи
 
 **Как пользоваться:**
 1. Нажми «💸 Добавить расход»
@@ -614,6 +1197,9 @@ class ExpenseBot:
 3. Выбери категорию
 4. Добавь описание (необязательно)
 
+Или просто напиши расход одним сообщением: 350 еда обед
+Расход в валюте: 12 eur еда кофе (курсы - /rates)
+
 **Категории расходов:**
 🍔 Еда, 🚗 Транспорт, 🏠 Дом, 👗 Одежда и другие
 
@@ -627,6 +1213,7 @@ class ExpenseBot:
 
     async def back_to_main(self, update: Update, context: CallbackContext):
         """Возврат в главное меню"""
+        self._reset_awaiting(context)
         await update.message.reply_text(
             "Главное меню:",
             reply_markup=get_main_keyboard()
@@ -637,6 +1224,34 @@ class ExpenseBot:
         logger.info("Бот запущен...")
         self.application.run_polling()
 
+    def run_webhook(self, webhook_url, base_port, secret_token=None):
+        """Запуск процесса бота за роутером вебхуков (webhook_router.py)"""
+        from webhook_router import WEBHOOK_PATH, worker_port
+        
+        port = worker_port(self.worker_index, base_port)
+        logger.info("Процесс бота %d из %d слушает порт %d", self.worker_index, self.worker_count, port)
+        self.application.run_webhook(
+            listen='127.0.0.1',
+            port=port,
+            url_path=WEBHOOK_PATH,
+            webhook_url=webhook_url,
+            secret_token=secret_token
+        )
+
 if __name__ == '__main__':
-    bot = ExpenseBot(BOT_TOKEN)
-    bot.run()
\ No newline at end of file
+    from config import BOT_TOKEN
+    
+    bot = ExpenseBot(
+        BOT_TOKEN,
+        storage=create_storage_from_env(),
+        worker_index=int(os.environ.get('WORKER_INDEX', '0')),
+        worker_count=int(os.environ.get('WORKER_COUNT', '1'))
+    )
+    if os.environ.get('BOT_MODE', 'polling') == 'webhook':
+        bot.run_webhook(
+            os.environ['WEBHOOK_URL'],
+            int(os.environ.get('WORKER_BASE_PORT', '8001')),
+            os.environ.get('WEBHOOK_SECRET')
+        )
+    else:
+        bot.run()
\ No newline at end of file
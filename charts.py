@@ -0,0 +1,78 @@
+import io
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Сколько file_id готовых картинок держать в памяти
+CHART_CACHE_SIZE = 256
+
+
+def _new_figure(width, height):
+    """Создание фигуры matplotlib без GUI (бэкенд Agg)"""
+    # matplotlib импортируем здесь: графики строятся в отдельных процессах,
+    # и основному процессу бота эта библиотека не нужна
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    return Figure(figsize=(width, height), dpi=100)
+
+
+def _to_png(figure):
+    """Сохранение фигуры в PNG"""
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def render_breakdown(title, labels, values):
+    """Круговая и столбчатая диаграммы расходов по категориям, PNG"""
+    figure = _new_figure(11, 5)
+    figure.suptitle(title)
+    pie_axes, bar_axes = figure.subplots(1, 2)
+
+    pie_axes.pie(values, labels=labels, autopct='%1.1f%%', startangle=90, counterclock=False)
+    pie_axes.axis('equal')
+
+    positions = range(len(labels))
+    bar_axes.barh(positions, values, color='tab:blue')
+    bar_axes.set_yticks(list(positions), labels=labels)
+    bar_axes.invert_yaxis()
+    bar_axes.set_xlabel('руб.')
+    for position, value in zip(positions, values):
+        bar_axes.text(value, position, f' {value:.0f}', va='center')
+
+    return _to_png(figure)
+
+
+def render_trend(title, labels, values):
+    """Линейный график расходов по месяцам, PNG"""
+    figure = _new_figure(10, 4.5)
+    axes = figure.subplots()
+    axes.set_title(title)
+    axes.plot(labels, values, marker='o', color='tab:red')
+    axes.fill_between(labels, values, alpha=0.1, color='tab:red')
+    axes.set_ylabel('руб.')
+    axes.grid(True, alpha=0.3)
+    axes.tick_params(axis='x', rotation=45)
+    return _to_png(figure)
+
+
+class ChartCache:
+    """Кэш Telegram file_id готовых графиков: (пользователь, период, версия данных) -> file_id"""
+
+    def __init__(self, max_size=CHART_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def get(self, key):
+        file_id = self._items.get(key)
+        if file_id is not None:
+            self._items.move_to_end(key)
+        return file_id
+
+    def put(self, key, file_id):
+        self._items[key] = file_id
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
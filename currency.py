@@ -0,0 +1,73 @@
+import csv
+import logging
+import math
+import re
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Валюта, в которой хранятся суммы расходов и считается вся статистика
+BASE_CURRENCY = 'RUB'
+
+# Файл с курсами: строки "валюта,дата,курс", курс - рублей за единицу валюты
+RATES_FILE = 'rates.csv'
+
+# Как пользователь может написать валюту
+CURRENCY_ALIASES = {
+    'rub': 'RUB', 'руб': 'RUB', 'руб.': 'RUB', 'р': 'RUB', 'р.': 'RUB', '₽': 'RUB',
+    'eur': 'EUR', 'евро': 'EUR', '€': 'EUR',
+    'usd': 'USD', 'долл': 'USD', 'доллар': 'USD', 'долларов': 'USD', '$': 'USD',
+    'try': 'TRY', 'лир': 'TRY', 'лира': 'TRY', 'лиры': 'TRY', '₺': 'TRY',
+}
+
+# Символы валют, которые пишут слитно с суммой: "10€"
+CURRENCY_SYMBOLS = '₽€$₺'
+
+# Сумма: только цифры и дробная часть через точку или запятую
+# (float сам по себе принимает еще "nan", "inf", "1e3" и "1_000")
+AMOUNT_RE = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+class RateNotFoundError(LookupError):
+    """Для валюты нет ни одного курса на нужную дату или раньше"""
+
+
+def parse_currency(word):
+    """Код валюты по слову пользователя или None"""
+    return CURRENCY_ALIASES.get(word.lower())
+
+
+def parse_money(text):
+    """Сумма и валюта из строки "150.50", "10 eur", "10€"; ValueError, если не разобрать"""
+    text = text.strip()
+    currency = BASE_CURRENCY
+    if text and text[-1] in CURRENCY_SYMBOLS:
+        currency = CURRENCY_ALIASES[text[-1]]
+        text = text[:-1]
+    else:
+        amount_str, _, currency_str = text.partition(' ')
+        if currency_str:
+            currency = parse_currency(currency_str.strip())
+            if currency is None:
+                raise ValueError(f"Неизвестная валюта: {currency_str}")
+            text = amount_str
+    text = text.strip()
+    if not AMOUNT_RE.fullmatch(text):
+        raise ValueError(f"Некорректная сумма: {text}")
+    amount = float(text.replace(',', '.'))
+    if not math.isfinite(amount):
+        raise ValueError(f"Некорректная сумма: {text}")
+    return amount, currency
+
+
+def load_rates_file(path=RATES_FILE):
+    """Чтение курсов из CSV-файла: список (валюта, дата ISO, курс)"""
+    rates = []
+    with open(path, newline='', encoding='utf-8') as rates_file:
+        for row in csv.reader(rates_file):
+            if not row or row[0].startswith('#') or row[0].lower() == 'currency':
+                continue
+            currency, day, rate = (value.strip() for value in row[:3])
+            rates.append((currency.upper(), date.fromisoformat(day).isoformat(), float(rate)))
+    logger.info("Прочитано курсов валют: %d", len(rates))
+    return rates
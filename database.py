@@ -1,19 +1,75 @@
+import os
+import re
 import sqlite3
+from bisect import bisect_right
 from datetime import datetime, date, timedelta
 import logging
 
+from currency import BASE_CURRENCY, RateNotFoundError
+from recurring import due_dates, idempotency_key
+from storage import SQLiteStorage
+
 logger = logging.getLogger(__name__)
 
+# Слова поискового запроса (буквы/цифры, включая кириллицу)
+SEARCH_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Версия схемы базы (PRAGMA user_version). Увеличивать при каждом изменении _init_schema
+SCHEMA_VERSION = 4
+
+# Колонки расходов, которые переносятся в архив и видны отчетам
+ARCHIVE_COLUMNS = 'id, user_id, amount, category, description, date, idempotency_key, currency, original_amount'
+
+# Полнотекстовый индекс расходов; такой же есть в файле архива
+FTS_TABLE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.expenses_fts USING fts5(
+        description,
+        category,
+        content='expenses',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+'''
+
+# Поиск по одному индексу (основному или архивному)
+FTS_SEARCH = '''
+    SELECT e.category, e.amount, e.description, e.date, f.rank
+    FROM {schema}.expenses_fts f
+    JOIN {schema}.expenses e ON e.id = f.rowid
+    WHERE f.expenses_fts MATCH ? AND e.user_id = ?
+'''
+
 class Database:
-    def __init__(self, db_name='expenses.db'):
-        self.db_name = db_name
+    def __init__(self, db_name='expenses.db', storage=None):
+        # Где лежат файлы базы: один файл или шарды по семьям
+        self.storage = storage or SQLiteStorage(db_name)
+        self.db_name = self.storage.db_name
+        # Курсы валют в памяти: валюта -> (даты ISO по возрастанию, курсы).
+        # Читаются из базы один раз, чтобы пересчет суммы не ждал занятую базу
+        self._rates = None
         self.init_db()
 
     def init_db(self):
-        """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_name)
+        """Инициализация базы данных
+
+        Если версия схемы в файле совпадает с SCHEMA_VERSION, DDL не выполняется:
+        перезапуск бота обходится одним PRAGMA на файл.
+        """
+        for conn in self.storage.connect_all():
+            if conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION:
+                conn.close()
+                continue
+            self._init_schema(conn)
+            logger.info("База данных инициализирована")
+
+    def _init_schema(self, conn):
+        """Создание таблиц, индексов и триггеров в одном файле базы"""
         cursor = conn.cursor()
         
+        # Освобождение места понемногу (PRAGMA incremental_vacuum). Действует только
+        # для нового файла; старые файлы переводит Database.enable_incremental_vacuum
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        
         # Таблица пользователей
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -24,6 +80,11 @@ class Database:
             )
         ''')
         
+        # Время последнего сообщения пользователя
+        cursor.execute('PRAGMA table_info(users)')
+        if 'last_seen' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE users ADD COLUMN last_seen TIMESTAMP')
+        
         # Таблица категорий
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS categories (
@@ -46,6 +107,105 @@ class Database:
             )
         ''')
         
+        # Ключ идемпотентности: расход с одним ключом не может быть записан дважды
+        cursor.execute('PRAGMA table_info(expenses)')
+        expense_columns = [column[1] for column in cursor.fetchall()]
+        if 'idempotency_key' not in expense_columns:
+            cursor.execute('ALTER TABLE expenses ADD COLUMN idempotency_key TEXT')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_idempotency_key ON expenses (idempotency_key)
+        ''')
+        
+        # Валюта расхода и сумма в ней; amount всегда в базовой валюте
+        if 'currency' not in expense_columns:
+            cursor.execute(f"ALTER TABLE expenses ADD COLUMN currency TEXT NOT NULL DEFAULT '{BASE_CURRENCY}'")
+        if 'original_amount' not in expense_columns:
+            cursor.execute('ALTER TABLE expenses ADD COLUMN original_amount REAL')
+        
+        # Таблица курсов валют (рублей за единицу валюты на дату)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS exchange_rates (
+                currency TEXT NOT NULL,
+                day DATE NOT NULL,
+                rate REAL NOT NULL,
+                PRIMARY KEY (currency, day)
+            )
+        ''')
+        
+        # Таблица регулярных расходов
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_expenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                category TEXT NOT NULL,
+                description TEXT,
+                period TEXT NOT NULL CHECK (period IN ('monthly', 'weekly')),
+                anchor_day INTEGER NOT NULL,
+                start_date DATE NOT NULL,
+                last_date DATE,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        ''')
+        
+        # Индекс для выборок расходов пользователя по датам
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date)
+        ''')
+        
+        # Полнотекстовый индекс по описанию и категории
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expenses_fts'"
+        )
+        fts_exists = cursor.fetchone() is not None
+        
+        cursor.execute(FTS_TABLE.format(schema='main'))
+        
+        # Триггеры синхронизации индекса с таблицей расходов
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS expenses_fts_ai AFTER INSERT ON expenses BEGIN
+                INSERT INTO expenses_fts (rowid, description, category)
+                VALUES (new.id, new.description, new.category);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS expenses_fts_ad AFTER DELETE ON expenses BEGIN
+                INSERT INTO expenses_fts (expenses_fts, rowid, description, category)
+                VALUES ('delete', old.id, old.description, old.category);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS expenses_fts_au AFTER UPDATE ON expenses BEGIN
+                INSERT INTO expenses_fts (expenses_fts, rowid, description, category)
+                VALUES ('delete', old.id, old.description, old.category);
+                INSERT INTO expenses_fts (rowid, description, category)
+                VALUES (new.id, new.description, new.category);
+            END
+        ''')
+        
+        # Версии данных для инвалидации кэшей: растут при любом изменении расходов
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+        for event, row in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+            # Версия 3 вела еще общую версию всех пользователей (user_id = 0)
+            cursor.execute(f'DROP TRIGGER IF EXISTS data_versions_{event.lower()}')
+            cursor.execute(f'''
+                CREATE TRIGGER data_versions_{event.lower()} AFTER {event} ON expenses BEGIN
+                    INSERT INTO data_versions (user_id, version)
+                    VALUES ({row}.user_id, 1)
+                    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+                END
+            ''')
+        cursor.execute('DELETE FROM data_versions WHERE user_id = 0')
+        
+        # Индекс создан впервые - заполняем его уже существующими расходами
+        if not fts_exists:
+            cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+        
         # Добавляем основные категории
         default_categories = [
             ('🍔 Еда', '🍔'),
@@ -66,39 +226,435 @@ class Database:
             INSERT OR IGNORE INTO categories (name, emoji) VALUES (?, ?)
         ''', default_categories)
         
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
         conn.close()
-        logger.info("База данных инициализирована")
 
     def add_user(self, user_id, username, first_name):
-        """Добавление пользователя"""
-        conn = sqlite3.connect(self.db_name)
+        """Добавление пользователя или обновление имени (дата регистрации сохраняется)"""
+        conn = self.storage.connect(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, first_name) 
+            INSERT INTO users (user_id, username, first_name)
             VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name
         ''', (user_id, username, first_name))
         
         conn.commit()
         conn.close()
 
-    def add_expense(self, user_id, amount, category, description=""):
-        """Добавление расхода"""
-        conn = sqlite3.connect(self.db_name)
+    def get_users(self):
+        """Все пользователи: user_id -> (username, first_name)"""
+        users = {}
+        for conn in self.storage.connect_all():
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id, username, first_name FROM users')
+            for user_id, username, first_name in cursor.fetchall():
+                users[user_id] = (username, first_name)
+            conn.close()
+        return users
+
+    def update_last_seen(self, last_seen):
+        """Запись времени последнего сообщения пачкой: user_id -> datetime"""
+        # Группируем по файлам базы, чтобы на каждый файл была одна транзакция
+        by_path = {}
+        for user_id, seen in last_seen.items():
+            by_path.setdefault(self.storage.path_for(user_id), []).append((seen, user_id))
+        
+        for path, rows in by_path.items():
+            conn = self.storage.connect_path(path)
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE users SET last_seen = ? WHERE user_id = ?
+            ''', rows)
+            conn.commit()
+            conn.close()
+
+    def add_expense(self, user_id, amount, category, description="", currency=BASE_CURRENCY):
+        """Добавление расхода. Возвращает сумму в базовой валюте
+
+        Сумма в другой валюте пересчитывается по курсу сразу при записи,
+        чтобы статистика оставалась простым SUM(amount).
+        """
+        now = datetime.now()
+        amount, original_amount = self.convert_amount(amount, currency, now.date())
+        
+        conn = self.storage.connect(user_id)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO expenses (user_id, amount, category, description, date, currency, original_amount)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, amount, category, description, now, currency, original_amount))
+        
+        conn.commit()
+        conn.close()
+        return amount
+
+    def convert_amount(self, amount, currency, day):
+        """Сумма в базовой валюте и исходная сумма (None для базовой валюты)"""
+        if currency == BASE_CURRENCY:
+            return amount, None
+        return round(amount * self.get_exchange_rate(currency, day), 2), amount
+
+    def add_journal_expenses(self, entries):
+        """Запись расходов из журнала (journal.py) пачкой
+
+        entries - словари с полями key, user_id, amount, category, description,
+        date, currency, original_amount; сумма уже в базовой валюте. Записи
+        с уже известным ключом идемпотентности пропускаются, любое другое
+        нарушение ограничений (например, NULL в amount) - sqlite3.IntegrityError.
+        Возвращает число новых расходов.
+        """
+        by_path = {}
+        for entry in entries:
+            by_path.setdefault(self.storage.path_for(entry['user_id']), []).append((
+                entry['user_id'], entry['amount'], entry['category'], entry['description'],
+                entry['date'], entry['currency'], entry['original_amount'], entry['key']
+            ))
+        
+        added = 0
+        for path, rows in by_path.items():
+            conn = self.storage.connect_path(path)
+            try:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO expenses
+                        (user_id, amount, category, description, date, currency, original_amount, idempotency_key)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (idempotency_key) DO NOTHING
+                ''', rows)
+                added += max(cursor.rowcount, 0)
+                conn.commit()
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            finally:
+                conn.close()
+        return added
+
+    def get_exchange_rate(self, currency, day):
+        """Курс валюты на дату (последний известный на эту дату) из курсов в памяти"""
+        if currency == BASE_CURRENCY:
+            return 1.0
+        
+        if self._rates is None:
+            self.load_exchange_rates()
+        days, rates = self._rates.get(currency, ((), ()))
+        index = bisect_right(days, day.isoformat())
+        if index == 0:
+            raise RateNotFoundError(f"Нет курса {currency} на {day}")
+        return rates[index - 1]
+
+    def load_exchange_rates(self):
+        """Чтение всех курсов валют из базы в память"""
+        conn = self.storage.connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT currency, day, rate FROM exchange_rates ORDER BY currency, day')
+        rates = {}
+        for currency, day, rate in cursor.fetchall():
+            days, values = rates.setdefault(currency, ([], []))
+            days.append(day)
+            values.append(rate)
+        conn.close()
+        
+        self._rates = rates
+
+    def save_exchange_rates(self, rates):
+        """Сохранение курсов валют: список (валюта, дата ISO, курс)"""
+        # Курсы - справочник, он нужен в каждом шарде
+        for conn in self.storage.connect_all():
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO exchange_rates (currency, day, rate)
+                VALUES (?, ?, ?)
+            ''', rates)
+            conn.commit()
+            conn.close()
+        self.load_exchange_rates()
+
+    def get_latest_exchange_rates(self):
+        """Последний известный курс каждой валюты: список (валюта, дата, курс)"""
+        conn = self.storage.connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT currency, MAX(day), rate
+            FROM exchange_rates
+            GROUP BY currency
+            ORDER BY currency
+        ''')
+        
+        rates = cursor.fetchall()
+        conn.close()
+        return rates
+
+    def get_recent_expenses(self, user_id, limit=10):
+        """Последние расходы пользователя вместе с их id"""
+        conn = self.storage.connect(user_id)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, category, amount, description, date
+            FROM expenses
+            WHERE user_id = ?
+            ORDER BY date DESC
+            LIMIT ?
+        ''', (user_id, limit))
+        
+        expenses = cursor.fetchall()
+        conn.close()
+        return expenses
+
+    def update_expense(self, expense_id, user_id, amount=None, category=None, description=None,
+                       currency=BASE_CURRENCY):
+        """Изменение расхода. Возвращает строку до изменения (колонки ARCHIVE_COLUMNS)
+        или None, если расход не найден
+
+        Новая сумма amount задается в валюте currency и пересчитывается
+        по курсу на дату расхода.
+        """
+        conn = self.storage.connect(user_id, isolation_level=None)
+        cursor = conn.cursor()
+        
+        try:
+            # Блокировку на запись берем сразу, чтобы прочитанная строка не устарела
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'''
+                SELECT {ARCHIVE_COLUMNS}
+                FROM expenses
+                WHERE id = ? AND user_id = ?
+            ''', (expense_id, user_id))
+            old_row = cursor.fetchone()
+            
+            if old_row is None:
+                cursor.execute('ROLLBACK')
+                return None
+            
+            if amount is None:
+                base_amount, currency, original_amount = old_row[2], old_row[7], old_row[8]
+            else:
+                day = date.fromisoformat(old_row[5][:10])
+                base_amount, original_amount = self.convert_amount(amount, currency, day)
+            
+            cursor.execute('''
+                UPDATE expenses
+                SET amount = ?, category = ?, description = ?, currency = ?, original_amount = ?
+                WHERE id = ?
+            ''', (
+                base_amount,
+                old_row[3] if category is None else category,
+                old_row[4] if description is None else description,
+                currency,
+                original_amount,
+                expense_id
+            ))
+            cursor.execute('COMMIT')
+        except (sqlite3.Error, RateNotFoundError):
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        
+        return old_row
+
+    def delete_expense(self, expense_id, user_id):
+        """Удаление расхода. Возвращает удаленную строку (колонки ARCHIVE_COLUMNS) или None"""
+        conn = self.storage.connect(user_id, isolation_level=None)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'''
+                SELECT {ARCHIVE_COLUMNS}
+                FROM expenses
+                WHERE id = ? AND user_id = ?
+            ''', (expense_id, user_id))
+            old_row = cursor.fetchone()
+            
+            if old_row is None:
+                cursor.execute('ROLLBACK')
+                return None
+            
+            cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+            cursor.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        
+        return old_row
+
+    def revert_expense(self, row):
+        """Возврат расхода к строке, полученной из update_expense (отмена изменения)
+
+        Все поля записываются как есть, включая пустое описание.
+        Возвращает True, если расход еще существует.
+        """
+        expense_id, user_id, amount, category, description, _, _, currency, original_amount = row
+        conn = self.storage.connect(user_id)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE expenses
+            SET amount = ?, category = ?, description = ?, currency = ?, original_amount = ?
+            WHERE id = ? AND user_id = ?
+        ''', (amount, category, description, currency, original_amount, expense_id, user_id))
+        reverted = cursor.rowcount > 0
+        
+        conn.commit()
+        conn.close()
+        return reverted
+
+    def restore_expense(self, row):
+        """Восстановление удаленного расхода с прежним id (отмена удаления)"""
+        conn = self.storage.connect(row[1])
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO expenses ({ARCHIVE_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', row)
+        restored = cursor.rowcount > 0
+        
+        conn.commit()
+        conn.close()
+        return restored
+
+    def add_recurring_expense(self, user_id, amount, category, description, period, anchor_day, start_date=None):
+        """Добавление правила регулярного расхода"""
+        conn = self.storage.connect(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT INTO expenses (user_id, amount, category, description, date)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, amount, category, description, datetime.now()))
+            INSERT INTO recurring_expenses (user_id, amount, category, description, period, anchor_day, start_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, amount, category, description, period, anchor_day,
+              (start_date or date.today()).isoformat()))
+        rule_id = cursor.lastrowid
         
         conn.commit()
         conn.close()
+        return rule_id
+
+    def get_recurring_expenses(self, user_id):
+        """Правила регулярных расходов пользователя"""
+        conn = self.storage.connect(user_id)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, amount, category, description, period, anchor_day
+            FROM recurring_expenses
+            WHERE user_id = ?
+            ORDER BY id
+        ''', (user_id,))
+        
+        rules = cursor.fetchall()
+        conn.close()
+        return rules
+
+    def delete_recurring_expense(self, rule_id, user_id):
+        """Удаление правила регулярного расхода (созданные расходы остаются)"""
+        conn = self.storage.connect(user_id)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            DELETE FROM recurring_expenses WHERE id = ? AND user_id = ?
+        ''', (rule_id, user_id))
+        deleted = cursor.rowcount > 0
+        
+        conn.commit()
+        conn.close()
+        return deleted
+
+    def materialize_recurring_expenses(self, today=None, worker_index=0, worker_count=1):
+        """Создание расходов по всем правилам за все наступившие даты
+
+        Пропущенные периоды (бот был выключен) тоже создаются. Повторный запуск
+        не создает дублей благодаря ключам идемпотентности. Каждый шард
+        обрабатывается одной транзакцией. При нескольких процессах бота каждый
+        обрабатывает только своих пользователей (user_id % worker_count == worker_index).
+        Возвращает число новых расходов.
+        """
+        today = today or date.today()
+        created = 0
+        for conn in self.storage.connect_all():
+            created += self._materialize_recurring_in(conn, today, worker_index, worker_count)
+        return created
+
+    def _materialize_recurring_in(self, conn, today, worker_index, worker_count):
+        """Создание регулярных расходов в одном файле базы"""
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, user_id, amount, category, description, period, anchor_day, start_date, last_date
+            FROM recurring_expenses
+            WHERE user_id % ? = ?
+        ''', (worker_count, worker_index))
+        rules = cursor.fetchall()
+        
+        new_expenses = []
+        processed_rules = []
+        for rule_id, user_id, amount, category, description, period, anchor_day, start_date, last_date in rules:
+            # Продолжаем со дня после последнего обработанного
+            start = date.fromisoformat(start_date)
+            if last_date:
+                start = max(start, date.fromisoformat(last_date) + timedelta(days=1))
+            
+            for due_date in due_dates(period, anchor_day, start, today):
+                new_expenses.append((
+                    user_id, amount, category, description,
+                    datetime.combine(due_date, datetime.min.time()),
+                    idempotency_key(rule_id, due_date)
+                ))
+            processed_rules.append((today.isoformat(), rule_id))
+        
+        cursor.executemany('''
+            INSERT OR IGNORE INTO expenses (user_id, amount, category, description, date, idempotency_key)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', new_expenses)
+        created = max(cursor.rowcount, 0)
+        cursor.executemany('''
+            UPDATE recurring_expenses SET last_date = ? WHERE id = ?
+        ''', processed_rules)
+        
+        conn.commit()
+        conn.close()
+        return created
+
+    def get_data_version(self, user_id):
+        """Текущая версия данных пользователя или семьи (кортеж user_id участников)
+
+        Версии ведут триггеры в базе, поэтому изменения, сделанные другими
+        процессами бота, тоже сбрасывают кэши. Версия семьи - сумма версий
+        участников: она растет при изменении расходов любого из них.
+        """
+        user_ids = user_id if isinstance(user_id, tuple) else (user_id,)
+        version = 0
+        # Обычно семья лежит в одном файле, но участник, добавленный в семью
+        # позже, остается в своем шарде
+        for path, members in self.storage.group_by_path(user_ids).items():
+            conn = self.storage.connect_path(path)
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT COALESCE(SUM(version), 0) FROM data_versions
+                WHERE user_id IN ({', '.join('?' * len(members))})
+            ''', members)
+            version += cursor.fetchone()[0]
+            conn.close()
+        return version
 
     def get_categories(self):
         """Получение списка категорий"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         cursor.execute('SELECT name, emoji FROM categories')
@@ -107,9 +663,20 @@ class Database:
         
         return [f"{emoji} {name}" for name, emoji in categories]
 
+    def get_category_names(self):
+        """Названия категорий без эмодзи (в таком виде они хранятся в расходах)"""
+        conn = self.storage.connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT name FROM categories ORDER BY id')
+        names = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        
+        return [' '.join(name.split()[1:]) if ' ' in name else name for name in names]
+
     def get_today_expenses(self, user_id):
         """Получение расходов за сегодня"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.storage.connect(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -125,7 +692,7 @@ class Database:
 
     def get_week_expenses(self, user_id):
         """Получение расходов за текущую неделю"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.storage.connect(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -141,7 +708,7 @@ class Database:
 
     def get_month_expenses(self, user_id):
         """Получение расходов за текущий месяц"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.storage.connect(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -157,7 +724,7 @@ class Database:
 
     def get_total_today(self, user_id):
         """Общая сумма расходов за сегодня"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.storage.connect(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -172,7 +739,7 @@ class Database:
 
     def get_total_week(self, user_id):
         """Общая сумма расходов за неделю"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.storage.connect(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -187,7 +754,7 @@ class Database:
 
     def get_total_month(self, user_id):
         """Общая сумма расходов за месяц"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.storage.connect(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -202,14 +769,31 @@ class Database:
 
     # НОВЫЕ МЕТОДЫ ДЛЯ ДЕТАЛИЗАЦИИ
 
+    def _connect_reports(self, user_id=None, path=None):
+        """Соединение для отчетов: представление all_expenses - расходы вместе с архивом"""
+        path = path or self.storage.path_for(user_id)
+        conn = self.storage.connect_path(path)
+        archive_path = self.storage.archive_path(path)
+        if os.path.exists(archive_path):
+            conn.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+            conn.execute(f'''
+                CREATE TEMP VIEW all_expenses AS
+                SELECT {ARCHIVE_COLUMNS} FROM main.expenses
+                UNION ALL
+                SELECT {ARCHIVE_COLUMNS} FROM archive.expenses
+            ''')
+        else:
+            conn.execute(f'CREATE TEMP VIEW all_expenses AS SELECT {ARCHIVE_COLUMNS} FROM main.expenses')
+        return conn
+
     def get_all_expenses(self, user_id, limit=50):
         """Получение всех расходов пользователя"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect_reports(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT category, amount, description, date 
-            FROM expenses 
+            FROM all_expenses 
             WHERE user_id = ? 
             ORDER BY date DESC 
             LIMIT ?
@@ -221,12 +805,12 @@ class Database:
 
     def get_expenses_by_date_range(self, user_id, start_date, end_date):
         """Получение расходов за период"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect_reports(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT category, amount, description, date 
-            FROM expenses 
+            FROM all_expenses 
             WHERE user_id = ? AND date(date) BETWEEN ? AND ?
             ORDER BY date DESC
         ''', (user_id, start_date, end_date))
@@ -237,7 +821,7 @@ class Database:
 
     def get_expenses_by_category(self, user_id, category):
         """Получение расходов по категории"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect_reports(user_id)
         cursor = conn.cursor()
         
         # Убираем эмодзи для поиска
@@ -245,7 +829,7 @@ class Database:
         
         cursor.execute('''
             SELECT category, amount, description, date 
-            FROM expenses 
+            FROM all_expenses 
             WHERE user_id = ? AND category = ?
             ORDER BY date DESC
         ''', (user_id, clean_category))
@@ -256,12 +840,12 @@ class Database:
 
     def get_largest_expenses(self, user_id, limit=10):
         """Получение самых крупных расходов"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect_reports(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT category, amount, description, date 
-            FROM expenses 
+            FROM all_expenses 
             WHERE user_id = ? 
             ORDER BY amount DESC 
             LIMIT ?
@@ -269,4 +853,176 @@ class Database:
         
         expenses = cursor.fetchall()
         conn.close()
-        return expenses
\ No newline at end of file
+        return expenses
+
+    def search_expenses(self, user_id, query, limit=10, offset=0):
+        """Полнотекстовый поиск расходов по описанию и категории (вместе с архивом)"""
+        match_query = self._build_match_query(query)
+        if not match_query:
+            return []
+        
+        path = self.storage.path_for(user_id)
+        conn = self.storage.connect_path(path)
+        cursor = conn.cursor()
+        
+        queries = [FTS_SEARCH.format(schema='main')]
+        params = [match_query, user_id]
+        archive_path = self.storage.archive_path(path)
+        if os.path.exists(archive_path):
+            cursor.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+            cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE name = 'expenses_fts'")
+            if cursor.fetchone() is not None:
+                queries.append(FTS_SEARCH.format(schema='archive'))
+                params += [match_query, user_id]
+        
+        cursor.execute(f'''
+            SELECT category, amount, description, date
+            FROM ({' UNION ALL '.join(queries)})
+            ORDER BY rank, date DESC
+            LIMIT ? OFFSET ?
+        ''', params + [limit, offset])
+        
+        expenses = cursor.fetchall()
+        conn.close()
+        return expenses
+
+    @staticmethod
+    def _build_match_query(query):
+        """Преобразование пользовательского запроса в выражение FTS5 с поиском по префиксу"""
+        # Каждое слово берем в кавычки, чтобы спецсимволы FTS5 не ломали запрос,
+        # и добавляем * для поиска по началу слова ("ремонт" найдет "ремонта")
+        tokens = SEARCH_TOKEN_RE.findall(query.lower())
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def get_expense_series(self, user_id):
+        """Все расходы пользователя или семьи (кортеж user_id участников) для аналитики
+
+        Возвращает строки (день с 1970-01-01, сумма, категория).
+        """
+        user_ids = user_id if isinstance(user_id, tuple) else (user_id,)
+        rows = []
+        for path, members in self.storage.group_by_path(user_ids).items():
+            conn = self._connect_reports(path=path)
+            cursor = conn.cursor()
+            # Номер дня считаем в SQL, чтобы не разбирать строки дат в Python
+            cursor.execute(f'''
+                SELECT CAST(julianday(date(date)) - 2440587.5 AS INTEGER), amount, category
+                FROM all_expenses
+                WHERE user_id IN ({', '.join('?' * len(members))})
+            ''', members)
+            rows.extend(cursor.fetchall())
+            conn.close()
+        return rows
+
+    # ОБСЛУЖИВАНИЕ БАЗЫ
+
+    def optimize(self):
+        """Обновление статистики планировщика запросов во всех файлах базы"""
+        for conn in self.storage.connect_all():
+            # Без статистики полный ANALYZE, дальше PRAGMA optimize сам решает,
+            # какие таблицы стоит переанализировать
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone() is not None
+            conn.execute('PRAGMA optimize' if has_stats else 'ANALYZE')
+            conn.commit()
+            conn.close()
+
+    def enable_incremental_vacuum(self):
+        """Перевод старых файлов базы в режим auto_vacuum = INCREMENTAL
+
+        Требует однократного полного VACUUM, который блокирует запись на время
+        работы. Возвращает число переведенных файлов.
+        """
+        converted = 0
+        for path in self.storage.paths():
+            conn = self.storage.connect_path(path, isolation_level=None)
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                logger.info("Перевод %s в режим incremental vacuum", path)
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+                converted += 1
+            conn.close()
+        return converted
+
+    def incremental_vacuum(self, pages=1000):
+        """Возврат свободных страниц файлам базы порциями по pages страниц
+
+        Возвращает число освобожденных страниц.
+        """
+        freed = 0
+        for conn in self.storage.connect_all(isolation_level=None):
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if before:
+                conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+                freed += before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+            conn.close()
+        return freed
+
+    def archive_expenses(self, before):
+        """Перенос расходов с датой раньше before (YYYY-MM-DD) в архивные файлы
+
+        Архив лежит рядом с файлом базы (storage.archive_path) и читается
+        отчетами через представление all_expenses, поиском - через полнотекстовый
+        индекс архива. Перенос в одной транзакции на оба файла: после сбоя
+        расход остается либо в базе, либо в архиве. Возвращает число
+        перенесенных расходов.
+        """
+        moved = 0
+        for path in self.storage.paths():
+            conn = self.storage.connect_path(path, isolation_level=None)
+            cursor = conn.cursor()
+            
+            # Не создаем файл архива, если переносить нечего. Существующий архив
+            # обрабатываем всегда: у архива из прошлых версий нет индекса поиска
+            cursor.execute('SELECT 1 FROM expenses WHERE date < ? LIMIT 1', (before,))
+            if cursor.fetchone() is None and not os.path.exists(self.storage.archive_path(path)):
+                conn.close()
+                continue
+            
+            cursor.execute('ATTACH DATABASE ? AS archive', (self.storage.archive_path(path),))
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS archive.expenses (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER,
+                    amount REAL NOT NULL,
+                    category TEXT NOT NULL,
+                    description TEXT,
+                    date TIMESTAMP,
+                    idempotency_key TEXT,
+                    currency TEXT NOT NULL,
+                    original_amount REAL
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS archive.idx_archive_user_date ON expenses (user_id, date)
+            ''')
+            # Архив остается доступным для поиска: у него свой полнотекстовый индекс
+            cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE name = 'expenses_fts'")
+            if cursor.fetchone() is None:
+                cursor.execute(FTS_TABLE.format(schema='archive'))
+                cursor.execute("INSERT INTO archive.expenses_fts (expenses_fts) VALUES ('rebuild')")
+            
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                # Без OR IGNORE: если такой id уже есть в архиве, перенос откатывается,
+                # а не удаляет расход, копия которого не записалась
+                cursor.execute(f'''
+                    INSERT INTO archive.expenses ({ARCHIVE_COLUMNS})
+                    SELECT {ARCHIVE_COLUMNS} FROM main.expenses WHERE date < ?
+                ''', (before,))
+                cursor.execute('''
+                    INSERT INTO archive.expenses_fts (rowid, description, category)
+                    SELECT id, description, category FROM main.expenses WHERE date < ?
+                ''', (before,))
+                # Триггеры чистят основной полнотекстовый индекс и сбрасывают версии данных
+                cursor.execute('DELETE FROM main.expenses WHERE date < ?', (before,))
+                moved += max(cursor.rowcount, 0)
+                cursor.execute('COMMIT')
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    cursor.execute('ROLLBACK')
+                raise
+            finally:
+                conn.close()
+        return moved
@@ -0,0 +1,123 @@
+import re
+from collections import namedtuple
+
+from currency import BASE_CURRENCY, CURRENCY_ALIASES, CURRENCY_SYMBOLS, parse_currency
+
+# Сумма в начале сообщения, затем (необязательно) символ валюты и остальной текст.
+# Тысячи можно отделять пробелом ("1 000", "300 500" = 300500): группа после
+# пробела - ровно три цифры, и за ней не идет цифра
+EXPENSE_RE = re.compile(
+    r'^\s*((?:\d{1,3}(?:[ \u00a0]\d{3})+|\d{1,9})(?:[.,]\d{1,2})?)\s*([' + CURRENCY_SYMBOLS + r'])?(?:\s+(.*?))?\s*$',
+    re.DOTALL
+)
+WORD_RE = re.compile(r'\S+')
+
+# Минимальная длина сокращения категории ("бенз" -> "Бензин")
+MIN_PREFIX_LENGTH = 3
+
+# Дополнительные слова, по которым узнается категория
+CATEGORY_ALIASES = {
+    'Еда': ['продукты', 'обед', 'ужин', 'завтрак', 'кафе', 'магазин'],
+    'Бензин': ['заправка', 'топливо', 'азс'],
+    'Дом': ['аренда', 'ремонт'],
+    'Одежда': ['обувь'],
+    'Здоровье': ['аптека', 'лекарства', 'врач'],
+    'Посиделки': ['бар', 'пиво'],
+    'Связь': ['телефон', 'интернет'],
+    'Коммуналка': ['жкх', 'свет', 'вода', 'газ'],
+    'Подарки': ['подарок'],
+    'Кредиты': ['кредит', 'ипотека'],
+    'Курение': ['сигареты'],
+    'Животные': ['корм', 'ветеринар'],
+}
+
+ParsedExpense = namedtuple('ParsedExpense', ['amount', 'category', 'description', 'currency'])
+
+
+def normalize_word(word):
+    """Приведение слова к виду для поиска: нижний регистр, ё -> е, без знаков препинания"""
+    return word.lower().replace('ё', 'е').strip('.,;:!?()"\'')
+
+
+class CategoryTrie:
+    """Префиксное дерево псевдонимов категорий"""
+
+    # Служебные ключи узла: категория, которой заканчивается слово, и все категории ниже узла
+    _END = '$'
+    _BELOW = '*'
+
+    def __init__(self):
+        self._root = {self._BELOW: set()}
+
+    def add(self, alias, category):
+        node = self._root
+        node[self._BELOW].add(category)
+        for char in normalize_word(alias):
+            node = node.setdefault(char, {self._BELOW: set()})
+            node[self._BELOW].add(category)
+        node[self._END] = category
+
+    def lookup(self, word):
+        """Категория по слову: точное совпадение или однозначное сокращение, иначе None"""
+        node = self._root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return None
+
+        if self._END in node:
+            return node[self._END]
+        if len(word) >= MIN_PREFIX_LENGTH and len(node[self._BELOW]) == 1:
+            return next(iter(node[self._BELOW]))
+        return None
+
+
+class ExpenseParser:
+    """Разбор расхода из одного сообщения, например: 350 еда обед или 1200,50 бензин"""
+
+    def __init__(self, category_names):
+        self.trie = CategoryTrie()
+        for name in category_names:
+            self.trie.add(name, name)
+            for alias in CATEGORY_ALIASES.get(name, ()):
+                self.trie.add(alias, name)
+
+    def parse(self, text):
+        """ParsedExpense или None, если текст не начинается с суммы
+
+        Валюту можно указать символом после суммы или словом: "10€ еда", "10 eur еда".
+
+        Если категорию узнать не удалось, category будет None - тогда
+        ее нужно спросить у пользователя. Если за суммой идет еще одно число
+        ("350 12 еда"), непонятно, какое из них сумма: amount будет None,
+        и сумму тоже нужно спросить.
+        """
+        match = EXPENSE_RE.match(text)
+        if match is None:
+            return None
+
+        amount = float(re.sub(r'[ \u00a0]', '', match.group(1)).replace(',', '.'))
+        words = WORD_RE.findall(match.group(3) or '')
+
+        currency = CURRENCY_ALIASES[match.group(2)] if match.group(2) else None
+        if currency is None and words:
+            currency = parse_currency(words[0])
+            if currency is not None:
+                words = words[1:]
+        currency = currency or BASE_CURRENCY
+
+        if words and words[0][0].isdigit():
+            return ParsedExpense(None, None, '', currency)
+
+        # Категория - первое слово, которое узнается. Из описания убирается
+        # только само название категории (или его сокращение), а слово-псевдоним
+        # ("обед", "аптека") остается: "350 обед в кафе" -> описание "обед в кафе"
+        for i, word in enumerate(words):
+            normalized = normalize_word(word)
+            category = self.trie.lookup(normalized)
+            if category is not None:
+                if normalize_word(category).startswith(normalized):
+                    words = words[:i] + words[i + 1:]
+                return ParsedExpense(amount, category, ' '.join(words), currency)
+
+        return ParsedExpense(amount, None, ' '.join(words), currency)
@@ -0,0 +1,186 @@
+"""Журнал упреждающей записи расходов
+
+Расход сначала дописывается строкой JSON в локальный файл и сразу
+подтверждается пользователю, даже если база занята (резервная копия,
+миграция, "database is locked"). Фоновая задача переносит записи в базу
+пачками. У каждой записи свой ключ идемпотентности, поэтому повторный
+перенос после сбоя или перезапуска не создает дублей.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from currency import BASE_CURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать после нового расхода, чтобы собрать пачку (секунды)
+JOURNAL_BATCH_DELAY = 0.2
+# Через сколько повторить перенос, если база недоступна (секунды)
+JOURNAL_RETRY_INTERVAL = 5
+# Сбрасывать ли запись на диск (fsync) до подтверждения пользователю
+JOURNAL_FSYNC = True
+
+
+def journal_key():
+    """Ключ идемпотентности записи журнала"""
+    return f"journal:{uuid.uuid4().hex}"
+
+
+def ends_with_newline(path):
+    """Заканчивается ли непустой файл переводом строки"""
+    with open(path, 'rb') as journal:
+        journal.seek(-1, os.SEEK_END)
+        return journal.read(1) == b'\n'
+
+
+class ExpenseJournal:
+    """Журнал одного процесса бота: файл path и файл path.replay с переносимой пачкой"""
+
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.replay_path = path + '.replay'
+        # Записи, которые не удалось перенести в базу, - для ручного разбора
+        self.bad_path = path + '.bad'
+        # Защищает файл журнала от одновременной записи и переименования
+        self._lock = threading.Lock()
+        # Перенос целиком (чтение, запись в базу, удаление .replay) идет в одном потоке
+        self._replay_lock = threading.Lock()
+        self._file = None
+        # Сигнал фоновой задаче о новых записях и ее цикл событий (создаются в run)
+        self._wakeup = None
+        self._loop = None
+
+    def add(self, user_id, amount, category, description="", currency=BASE_CURRENCY):
+        """Запись расхода в журнал. Возвращает сумму в базовой валюте
+
+        Курс берется сразу из курсов в памяти (RateNotFoundError, если его нет),
+        чтобы запись в журнале не могла быть отклонена при переносе в базу.
+        Запись с fsync блокирует поток, поэтому из бота метод вызывается
+        через asyncio.to_thread.
+        """
+        now = datetime.now()
+        base_amount, original_amount = self.db.convert_amount(amount, currency, now.date())
+        entry = {
+            'key': journal_key(),
+            'user_id': user_id,
+            'amount': base_amount,
+            'category': category,
+            'description': description,
+            # Тот же формат, в котором sqlite3 сохраняет datetime
+            'date': str(now),
+            'currency': currency,
+            'original_amount': original_amount,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                    # Недописанная строка после аварийной остановки: новая запись
+                    # должна начаться с новой строки, а не склеиться с обрывком
+                    if os.path.getsize(self.path) > 0 and not ends_with_newline(self.path):
+                        self._file.write('\n')
+                self._file.write(line)
+                self._file.flush()
+                if JOURNAL_FSYNC:
+                    os.fsync(self._file.fileno())
+            except OSError:
+                # После частичной записи файл открывается заново с проверкой конца
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                raise
+
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return base_amount
+
+    def replay(self):
+        """Перенос записей журнала в базу. Возвращает число новых расходов
+
+        Если база недоступна, исключение sqlite3 пробрасывается, а пачка
+        остается в файле .replay до следующей попытки. Строки, которые
+        не удалось прочитать, переносятся в файл .bad.
+        """
+        with self._replay_lock:
+            with self._lock:
+                # Прошлая пачка не перенесена - сначала она, новые записи копятся дальше
+                if not os.path.exists(self.replay_path):
+                    if self._file is not None:
+                        self._file.close()
+                        self._file = None
+                    if not os.path.exists(self.path):
+                        return 0
+                    os.replace(self.path, self.replay_path)
+
+            entries = []
+            with open(self.replay_path, encoding='utf-8') as journal:
+                for line in journal:
+                    if not line.strip():
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # Недописанная строка после аварийной остановки
+                        logger.warning("Поврежденная запись журнала перенесена в %s: %r", self.bad_path, line)
+                        self._set_aside(line if line.endswith('\n') else line + '\n')
+
+            try:
+                added = self.db.add_journal_expenses(entries)
+            except sqlite3.IntegrityError:
+                # Запись, которую база не принимает, не должна держать всю пачку:
+                # переносим по одной, отклоненные откладываем в файл .bad
+                added = 0
+                for entry in entries:
+                    try:
+                        added += self.db.add_journal_expenses([entry])
+                    except sqlite3.IntegrityError as error:
+                        logger.error("Расход из журнала отклонен базой (%s): %r", error, entry)
+                        self._set_aside(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.remove(self.replay_path)
+            return added
+
+    def _set_aside(self, line):
+        """Сохранение строки журнала, которую нельзя перенести, в файл .bad"""
+        with open(self.bad_path, 'a', encoding='utf-8') as bad:
+            bad.write(line)
+            bad.flush()
+            os.fsync(bad.fileno())
+
+    def flush(self):
+        """Перенос в базу всего журнала. Возвращает число новых расходов"""
+        added = 0
+        while os.path.exists(self.replay_path) or os.path.exists(self.path):
+            added += self.replay()
+        return added
+
+    async def run(self):
+        """Фоновая задача переноса журнала в базу"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # Записи, оставшиеся с прошлого запуска, переносим сразу
+        self._wakeup.set()
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(JOURNAL_BATCH_DELAY)
+            self._wakeup.clear()
+            try:
+                added = await asyncio.to_thread(self.flush)
+                if added:
+                    logger.debug("Перенесено из журнала расходов: %d", added)
+            except sqlite3.Error as error:
+                logger.warning("База недоступна (%s), расходы остаются в журнале", error)
+                await asyncio.sleep(JOURNAL_RETRY_INTERVAL)
+                self._wakeup.set()
+            except Exception:
+                logger.exception("Ошибка переноса журнала расходов")
+                await asyncio.sleep(JOURNAL_RETRY_INTERVAL)
+                self._wakeup.set()
@@ -26,6 +26,10 @@ def get_statistics_keyboard():
     keyboard = [
         [KeyboardButton("📊 Сегодня"), KeyboardButton("📅 Неделя")],
         [KeyboardButton("📈 Месяц"), KeyboardButton("📋 Детализация")],
+        [KeyboardButton("📉 Тренды"), KeyboardButton("👨‍👩‍👧 Тренды семьи")],
+        [KeyboardButton("🗓 По дням недели"), KeyboardButton("🥧 Доли категорий")],
+        [KeyboardButton("🖼 Диаграмма недели"), KeyboardButton("🖼 Диаграмма месяца")],
+        [KeyboardButton("📈 График по месяцам")],
         [KeyboardButton("↩️ Назад")]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
@@ -35,6 +39,7 @@ def get_detailed_stats_keyboard():
     keyboard = [
         [KeyboardButton("📋 Все расходы"), KeyboardButton("📅 По дате")],
         [KeyboardButton("📁 По категории"), KeyboardButton("💰 Самые крупные")],
+        [KeyboardButton("🔍 Поиск"), KeyboardButton("🗂 Последние")],
         [KeyboardButton("↩️ Назад в статистику")]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
@@ -50,6 +55,14 @@ def get_categories_for_filter():
     ]
     return ReplyKeyboardMarkup(categories, resize_keyboard=True)
 
+def get_search_keyboard():
+    """Клавиатура для листания результатов поиска"""
+    keyboard = [
+        [KeyboardButton("➡️ Ещё результаты")],
+        [KeyboardButton("↩️ Назад в статистику")]
+    ]
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
 def get_back_keyboard():
     """Клавиатура с кнопкой Назад"""
     return ReplyKeyboardMarkup([
@@ -60,7 +73,8 @@ def get_settings_keyboard():
     """Клавиатура настроек"""
     keyboard = [
         [KeyboardButton("👤 Мой профиль"), KeyboardButton("📊 Лимиты")],
-        [KeyboardButton("🔔 Уведомления"), KeyboardButton("↩️ Назад")]
+        [KeyboardButton("🔔 Уведомления"), KeyboardButton("🔁 Регулярные")],
+        [KeyboardButton("↩️ Назад")]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
@@ -69,4 +83,19 @@ def get_description_keyboard():
     return ReplyKeyboardMarkup([
         [KeyboardButton("Пропустить")],
         [KeyboardButton("↩️ Назад")]
-    ], resize_keyboard=True)
\ No newline at end of file
+    ], resize_keyboard=True)
+
+def get_expense_actions_keyboard(expense_ids):
+    """Инлайн-кнопки изменения и удаления для списка расходов"""
+    keyboard = [
+        [InlineKeyboardButton(f"✏️ {i}", callback_data=f"exp_edit:{expense_id}"),
+         InlineKeyboardButton(f"🗑 {i}", callback_data=f"exp_del:{expense_id}")]
+        for i, expense_id in enumerate(expense_ids, 1)
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def get_undo_keyboard(action_id):
+    """Инлайн-кнопка отмены изменения с номером action_id"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("↩️ Отменить", callback_data=f"exp_undo:{action_id}")]
+    ])
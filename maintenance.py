@@ -0,0 +1,137 @@
+"""Обслуживание базы: резервные копии, статистика планировщика, vacuum и архив
+
+Запускается фоновой задачей в первом процессе бота или вручную (например,
+из cron): python maintenance.py
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Как часто выполнять обслуживание (секунды)
+MAINTENANCE_INTERVAL = 24 * 60 * 60
+
+# Задержка первого прохода после запуска бота, чтобы не мешать старту (секунды)
+MAINTENANCE_START_DELAY = 10 * 60
+
+# Каталог резервных копий и сколько последних копий каждого файла хранить
+BACKUP_DIR = 'backups'
+BACKUP_KEEP = 7
+
+# Копирование порциями: между порциями база свободна для записи
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.05
+
+# Расходы старше стольких лет переносятся в архив (0 - не переносить)
+ARCHIVE_YEARS = 3
+
+# Сколько свободных страниц возвращать файлу за один проход
+VACUUM_PAGES = 1000
+
+
+def backup_file(path, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, connect=sqlite3.connect):
+    """Онлайн-копия одного файла базы через backup API SQLite
+
+    Копия пишется во временный файл и переименовывается только после
+    завершения, поэтому в каталоге не бывает недописанных копий.
+    Возвращает путь к копии.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    name, ext = os.path.splitext(os.path.basename(path))
+    target = os.path.join(backup_dir, f"{name}-{datetime.now():%Y%m%d-%H%M%S}{ext}")
+    partial = target + '.part'
+
+    source = connect(path)
+    destination = sqlite3.connect(partial)
+    try:
+        source.backup(destination, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+    finally:
+        destination.close()
+        source.close()
+    os.replace(partial, target)
+
+    # Старые копии этого файла удаляем, оставляя keep последних
+    prefix = f"{name}-"
+    copies = sorted(
+        entry for entry in os.listdir(backup_dir)
+        if entry.startswith(prefix) and entry.endswith(ext)
+        and entry[len(prefix):-len(ext)].replace('-', '').isdigit()
+    )
+    for old in copies[:-keep]:
+        os.remove(os.path.join(backup_dir, old))
+    return target
+
+
+def archive_cutoff(today=None, years=ARCHIVE_YEARS):
+    """Граница архива: первое число текущего месяца years лет назад (YYYY-MM-DD)"""
+    today = today or date.today()
+    return today.replace(year=today.year - years, day=1).isoformat()
+
+
+class MaintenanceScheduler:
+    """Фоновая задача обслуживания базы"""
+
+    def __init__(self, db, interval=MAINTENANCE_INTERVAL, backup_dir=BACKUP_DIR,
+                 archive_years=ARCHIVE_YEARS):
+        self.db = db
+        self.interval = interval
+        self.backup_dir = backup_dir
+        self.archive_years = archive_years
+
+    def run_once(self):
+        """Один проход обслуживания по всем файлам базы"""
+        storage = self.db.storage
+
+        if self.archive_years > 0:
+            moved = self.db.archive_expenses(archive_cutoff(years=self.archive_years))
+            if moved:
+                logger.info("Перенесено в архив расходов: %d", moved)
+
+        self.db.enable_incremental_vacuum()
+        freed = self.db.incremental_vacuum(VACUUM_PAGES)
+        self.db.optimize()
+
+        # Копируем после архивации, чтобы копия отражала итоговое состояние
+        paths = storage.paths()
+        paths += [storage.archive_path(path) for path in paths if os.path.exists(storage.archive_path(path))]
+        paths += storage.service_paths()
+        backups = [backup_file(path, self.backup_dir, connect=storage.connect_path) for path in paths]
+        logger.info("Обслуживание базы: освобождено страниц %d, резервных копий %d", freed, len(backups))
+
+    async def run(self):
+        """Бесконечный цикл обслуживания"""
+        await asyncio.sleep(MAINTENANCE_START_DELAY)
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                logger.exception("Ошибка обслуживания базы")
+            await asyncio.sleep(self.interval)
+
+
+def main():
+    """Однократное обслуживание; настройки из переменных окружения
+
+    Хранилище - как у бота (см. storage.create_storage_from_env),
+    BACKUP_DIR - каталог копий, ARCHIVE_YEARS - возраст расходов для архива.
+    """
+    from database import Database
+    from storage import create_storage_from_env
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    scheduler = MaintenanceScheduler(
+        Database(storage=create_storage_from_env()),
+        backup_dir=os.environ.get('BACKUP_DIR', BACKUP_DIR),
+        archive_years=int(os.environ.get('ARCHIVE_YEARS', str(ARCHIVE_YEARS)))
+    )
+    scheduler.run_once()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Минимальный HTTP/1.1 сервер на asyncio для служебных компонентов (роутер вебхуков)"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 408: 'Request Timeout', 502: 'Bad Gateway'}
+
+# Ограничения на размер тела запроса (байты) и число заголовков
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADERS = 100
+
+# Сколько ждать следующего запроса в открытом соединении (секунды)
+IDLE_TIMEOUT = 60
+# Сколько ждать заголовков и тела начатого запроса (секунды): медленный
+# клиент не должен держать соединение бесконечно
+HEADERS_TIMEOUT = 10
+BODY_TIMEOUT = 30
+
+
+class HttpRequest:
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+async def read_headers(reader):
+    """Чтение заголовков запроса до пустой строки"""
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        if len(headers) >= MAX_HEADERS:
+            raise ValueError("Слишком много заголовков")
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+async def read_request(reader):
+    """Чтение одного запроса из соединения
+
+    None, если клиент закрыл соединение или молчит дольше IDLE_TIMEOUT;
+    asyncio.TimeoutError, если начатый запрос не дочитан за отведенное время.
+    """
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+    headers = await asyncio.wait_for(read_headers(reader), HEADERS_TIMEOUT)
+
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_SIZE:
+        raise ValueError(f"Слишком большой запрос: {length} байт")
+    body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT) if length else b''
+    return HttpRequest(method, path, headers, body)
+
+
+def build_response(status, body=b'', content_type='application/json'):
+    """Байты HTTP-ответа"""
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Unknown')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"\r\n"
+    )
+    return head.encode('latin-1') + body
+
+
+async def serve(handler, host, port):
+    """Запуск сервера: handler(request) -> (статус, тело) вызывается для каждого запроса"""
+
+    async def handle_connection(reader, writer):
+        try:
+            # Поддерживаем keep-alive: несколько запросов в одном соединении
+            while True:
+                try:
+                    request = await read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    writer.write(build_response(400))
+                    break
+                except asyncio.TimeoutError:
+                    writer.write(build_response(408))
+                    break
+                if request is None:
+                    break
+                status, body = await handler(request)
+                writer.write(build_response(status, body))
+                await writer.drain()
+                if request.headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            # Клиент отключился или сервер останавливается
+            pass
+        except Exception:
+            logger.exception("Ошибка обработки HTTP-запроса")
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port)
@@ -0,0 +1,16 @@
+"""Названия дней недели и месяцев, номера месяцев для отчетов"""
+
+WEEKDAY_NAMES = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+MONTH_NAMES = ['янв', 'фев', 'мар', 'апр', 'май', 'июн',
+               'июл', 'авг', 'сен', 'окт', 'ноя', 'дек']
+
+
+def month_number(day):
+    """Номер месяца с января 1970 года"""
+    return (day.year - 1970) * 12 + day.month - 1
+
+
+def format_month(number):
+    """Название месяца по номеру месяца с января 1970 года"""
+    year, month = divmod(int(number), 12)
+    return f"{MONTH_NAMES[month]} {1970 + year}"
@@ -0,0 +1,79 @@
+import asyncio
+import calendar
+import logging
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+PERIOD_MONTHLY = 'monthly'
+PERIOD_WEEKLY = 'weekly'
+
+# Как пользователь может написать период
+PERIOD_ALIASES = {
+    'monthly': PERIOD_MONTHLY,
+    'месяц': PERIOD_MONTHLY,
+    'ежемесячно': PERIOD_MONTHLY,
+    'weekly': PERIOD_WEEKLY,
+    'неделя': PERIOD_WEEKLY,
+    'еженедельно': PERIOD_WEEKLY,
+}
+
+# Как часто проверять, не пора ли создать регулярные расходы (секунды)
+RECURRING_CHECK_INTERVAL = 3600
+
+
+def due_dates(period, anchor_day, start, end):
+    """Даты платежей по правилу в интервале [start, end]
+
+    anchor_day - день месяца (1-31) для monthly или день недели (0 - понедельник) для weekly.
+    Если в месяце меньше дней, чем anchor_day, платеж приходится на последний день месяца.
+    """
+    if start > end:
+        return []
+
+    dates = []
+    if period == PERIOD_WEEKLY:
+        current = start + timedelta(days=(anchor_day - start.weekday()) % 7)
+        while current <= end:
+            dates.append(current)
+            current += timedelta(days=7)
+        return dates
+
+    year, month = start.year, start.month
+    while True:
+        day = min(anchor_day, calendar.monthrange(year, month)[1])
+        current = date(year, month, day)
+        if current > end:
+            break
+        if current >= start:
+            dates.append(current)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return dates
+
+
+def idempotency_key(rule_id, due_date):
+    """Ключ, по которому расход правила за конкретную дату создается ровно один раз"""
+    return f"recurring:{rule_id}:{due_date.isoformat()}"
+
+
+class RecurringScheduler:
+    """Фоновая задача: создает расходы по регулярным правилам, догоняя пропущенные периоды"""
+
+    def __init__(self, db, worker_index=0, worker_count=1, interval=RECURRING_CHECK_INTERVAL):
+        self.db = db
+        self.worker_index = worker_index
+        self.worker_count = worker_count
+        self.interval = interval
+
+    async def run(self):
+        """Бесконечный цикл проверки правил"""
+        while True:
+            try:
+                created = await asyncio.to_thread(
+                    self.db.materialize_recurring_expenses, None, self.worker_index, self.worker_count
+                )
+                if created:
+                    logger.info("Создано регулярных расходов: %d", created)
+            except Exception:
+                logger.exception("Ошибка при создании регулярных расходов")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,116 @@
+"""Сборка текстов отчетов для Telegram (HTML-разметка)
+
+Все данные пользователя (категории, описания, запросы) экранируются.
+Сообщения собираются из блоков через join и делятся на части только
+между блоками, поэтому теги никогда не разрезаются.
+"""
+
+# Режим разметки для отправки сообщений, собранных этим модулем
+PARSE_MODE = 'HTML'
+
+# Максимальная длина сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+# Длинные описания обрезаются, чтобы одна запись всегда помещалась в сообщение
+MAX_DESCRIPTION_LENGTH = 300
+
+# Поисковый запрос в заголовке обрезается так же: заголовок - один блок
+MAX_QUERY_LENGTH = 100
+
+_HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+def escape_html(text):
+    """Экранирование текста для parse_mode='HTML'"""
+    return str(text).translate(_HTML_ESCAPE)
+
+
+def format_date(date_string):
+    """Дата из базы ('2024-01-31 12:00:00[.ffffff]') в виде 31.01.2024"""
+    # Быстрый путь без strptime: формат в базе фиксированный
+    if len(date_string) >= 10 and date_string[4] == '-' and date_string[7] == '-':
+        return f"{date_string[8:10]}.{date_string[5:7]}.{date_string[0:4]}"
+    return date_string.split()[0]
+
+
+def truncate(text, limit):
+    """Текст не длиннее limit символов; обрезанный заканчивается многоточием"""
+    if len(text) > limit:
+        return text[:limit - 1] + '…'
+    return text
+
+
+def short_description(description, empty="без описания"):
+    """Экранированное описание, обрезанное до MAX_DESCRIPTION_LENGTH"""
+    if not description:
+        return empty
+    return escape_html(truncate(description, MAX_DESCRIPTION_LENGTH))
+
+
+# Шаблоны строк отчетов (заранее связанные методы format)
+TITLE = "<b>{}</b>\n\n".format
+SECTION = "<b>{}</b>\n".format
+TOTAL = "💵 <b>{}:</b> {:.2f} руб.\n".format
+COUNT = "📊 <b>Всего записей:</b> {}".format
+CATEGORY_SUM = "• {}: {:.2f} руб.\n".format
+CATEGORY_SHARE = "• {}: {:.2f} руб. ({:.1f}%)\n".format
+EXPENSE_ITEM = "{}. <b>{}</b> - {:.2f} руб.\n   📅 {} | 📝 {}\n\n".format
+CATEGORY_EXPENSE_ITEM = "{}. {:.2f} руб. | 📅 {}\n   📝 {}\n\n".format
+
+
+def split_blocks(blocks, limit=MESSAGE_LIMIT):
+    """Склейка блоков в сообщения не длиннее limit; блоки не разрезаются"""
+    messages = []
+    current = []
+    length = 0
+    for block in blocks:
+        if current and length + len(block) > limit:
+            messages.append(''.join(current))
+            current = []
+            length = 0
+        current.append(block)
+        length += len(block)
+    if current:
+        messages.append(''.join(current))
+    return messages
+
+
+def expense_items(expenses, start=1):
+    """Блоки списка расходов (категория, сумма, описание, дата)"""
+    return [
+        EXPENSE_ITEM(i, escape_html(category), amount, format_date(date), short_description(description))
+        for i, (category, amount, description, date) in enumerate(expenses, start)
+    ]
+
+
+def category_expense_items(expenses, start=1):
+    """Блоки списка расходов одной категории (без названия категории)"""
+    return [
+        CATEGORY_EXPENSE_ITEM(i, amount, format_date(date), short_description(description))
+        for i, (category, amount, description, date) in enumerate(expenses, start)
+    ]
+
+
+def expense_report(title, expenses, total_label="Итого", items=expense_items):
+    """Отчет со списком расходов, итогом и числом записей; список сообщений"""
+    blocks = [TITLE(escape_html(title))]
+    blocks.extend(items(expenses))
+    total = sum(expense[1] for expense in expenses)
+    blocks.append(TOTAL(escape_html(total_label), total) + COUNT(len(expenses)))
+    return split_blocks(blocks)
+
+
+def category_summary(title, total, expenses, empty_text, with_share=True):
+    """Сводка по категориям за период: общая сумма и суммы категорий"""
+    blocks = [TITLE(escape_html(title)), TOTAL("Общая сумма", total), "\n"]
+    if not expenses:
+        blocks.append(escape_html(empty_text))
+    else:
+        blocks.append(SECTION("По категориям:"))
+        for category, amount in expenses:
+            if with_share:
+                percentage = (amount / total) * 100 if total > 0 else 0
+                blocks.append(CATEGORY_SHARE(escape_html(category), amount, percentage))
+            else:
+                blocks.append(CATEGORY_SUM(escape_html(category), amount))
+    return split_blocks(blocks)
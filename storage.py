@@ -0,0 +1,225 @@
+"""Размещение файлов базы SQLite: один файл или шарды по семьям
+
+Хранилище решает только, в каком файле SQLite лежат данные пользователя,
+и отдает соединения sqlite3. Это не абстракция над СУБД: Database пишет
+SQL для SQLite (FTS5, date()/strftime(), PRAGMA, ATTACH архива), а рядом
+с файлами базы лежат архив и журнал расходов. PostgreSQL не поддерживается;
+для него понадобится переписать Database, а не добавить класс хранилища.
+"""
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать освобождения блокировки базы другим процессом (секунды)
+SQLITE_TIMEOUT = 10
+
+
+class SQLiteStorage:
+    """Хранилище в одном файле SQLite"""
+
+    def __init__(self, db_name='expenses.db', households=None):
+        self.db_name = db_name
+        # user_id -> id семьи; пользователь без семьи сам себе семья
+        self.households = households or {}
+        # id семьи -> участники
+        self._members = {}
+        for member, household in sorted(self.households.items()):
+            self._members.setdefault(household, []).append(member)
+
+    def household_members(self, user_id):
+        """Участники семьи пользователя (кортеж user_id, включая его самого)"""
+        household = self.households.get(user_id, user_id)
+        return tuple(self._members.get(household, (user_id,)))
+
+    def paths(self):
+        """Все файлы базы"""
+        return [self.db_name]
+
+    def path_for(self, user_id=None):
+        """Файл базы, в котором лежат данные пользователя"""
+        return self.db_name
+
+    def service_paths(self):
+        """Служебные файлы хранилища, которые тоже нужно копировать в резервную копию"""
+        return []
+
+    def group_by_path(self, user_ids):
+        """Пользователи, разложенные по файлам базы: путь -> кортеж user_id"""
+        groups = {}
+        for user_id in user_ids:
+            groups.setdefault(self.path_for(user_id), []).append(user_id)
+        return {path: tuple(members) for path, members in groups.items()}
+
+    def connect(self, user_id=None, **kwargs):
+        """Соединение с базой, в которой лежат данные пользователя"""
+        return self.connect_path(self.path_for(user_id), **kwargs)
+
+    def connect_path(self, path, **kwargs):
+        """Соединение с конкретным файлом базы"""
+        return sqlite3.connect(path, timeout=SQLITE_TIMEOUT, **kwargs)
+
+    def connect_all(self, **kwargs):
+        """Соединения со всеми файлами базы по очереди (для общих операций)"""
+        for path in self.paths():
+            yield self.connect_path(path, **kwargs)
+
+    def journal_path(self, worker_index=0):
+        """Журнал расходов процесса бота, еще не перенесенных в базу (journal.py)"""
+        base, _ = os.path.splitext(self.db_name)
+        return f'{base}_journal_{worker_index}.jsonl'
+
+    def archive_path(self, path):
+        """Файл архива (холодной части) для файла базы: expenses.db -> expenses_archive.db"""
+        base, ext = os.path.splitext(path)
+        return f'{base}_archive{ext}'
+
+
+class ShardedSQLiteStorage(SQLiteStorage):
+    """Несколько файлов SQLite: данные семьи лежат в одном файле (шарде)
+
+    Справочники (категории, курсы валют) копируются во все шарды, поэтому
+    запросы без пользователя идут в первый шард.
+
+    Шард выбирается один раз, при первом обращении пользователя, и хранится
+    в файле shard_map.db: изменение HOUSEHOLDS или SHARD_COUNT не переносит
+    уже записанные данные. Новый пользователь попадает в шард своей семьи.
+    """
+
+    def __init__(self, directory='shards', shard_count=4, households=None):
+        self.directory = directory
+        self.shard_count = shard_count
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(self.shard_path(0), households)
+        self.map_path = os.path.join(directory, 'shard_map.db')
+        # user_id -> номер шарда (копия shard_map.db в памяти)
+        self._assigned = self._load_assignments()
+
+    def shard_path(self, index):
+        return os.path.join(self.directory, f'expenses_{index}.db')
+
+    def service_paths(self):
+        return [self.map_path]
+
+    def _connect_map(self):
+        return self.connect_path(self.map_path)
+
+    def _load_assignments(self):
+        """Чтение закрепленных шардов; при первом запуске - по данным в шардах"""
+        conn = self._connect_map()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_shards (
+                user_id INTEGER PRIMARY KEY,
+                shard INTEGER NOT NULL
+            )
+        ''')
+        assigned = dict(conn.execute('SELECT user_id, shard FROM user_shards'))
+        if not assigned:
+            assigned = self._scan_shards()
+            conn.executemany('''
+                INSERT INTO user_shards (user_id, shard) VALUES (?, ?)
+                ON CONFLICT (user_id) DO NOTHING
+            ''', assigned.items())
+            conn.commit()
+            assigned = dict(conn.execute('SELECT user_id, shard FROM user_shards'))
+        conn.close()
+
+        outside = sorted(user_id for user_id, shard in assigned.items() if shard >= self.shard_count)
+        if outside:
+            raise ValueError(
+                f"Данные пользователей {outside[:10]} лежат в шардах за пределами "
+                f"SHARD_COUNT={self.shard_count}: уменьшение числа шардов не поддерживается"
+            )
+        return assigned
+
+    def _scan_shards(self):
+        """Шарды пользователей по уже записанным данным (хранилище без shard_map.db)"""
+        found = {}
+        for index in range(self.shard_count):
+            path = self.shard_path(index)
+            if not os.path.exists(path):
+                continue
+            conn = self.connect_path(path)
+            tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            queries = [f'SELECT user_id FROM {table}' for table in ('users', 'expenses') if table in tables]
+            user_ids = [user_id for (user_id,) in conn.execute(' UNION '.join(queries))] if queries else []
+            conn.close()
+            for user_id in user_ids:
+                found.setdefault(user_id, []).append(index)
+
+        split = sorted(user_id for user_id, shards in found.items() if len(shards) > 1)
+        if split:
+            raise ValueError(
+                f"Данные пользователей {split[:10]} лежат в нескольких шардах "
+                f"(менялись HOUSEHOLDS или SHARD_COUNT): перенесите их в один шард вручную"
+            )
+        return {user_id: shards[0] for user_id, shards in found.items()}
+
+    def shard_index(self, user_id):
+        shard = self._assigned.get(user_id)
+        if shard is None:
+            shard = self._assign(user_id)
+        return shard
+
+    def _assign(self, user_id):
+        """Закрепление шарда за новым пользователем"""
+        # Шард семьи - тот, где уже лежат данные кого-то из ее участников
+        household_shards = [
+            self._assigned[member] for member in self.household_members(user_id)
+            if member in self._assigned
+        ]
+        if household_shards:
+            shard = household_shards[0]
+        else:
+            shard = self.households.get(user_id, user_id) % self.shard_count
+
+        # Другой процесс бота мог закрепить шард раньше - тогда берем его выбор
+        conn = self._connect_map()
+        conn.execute('''
+            INSERT INTO user_shards (user_id, shard) VALUES (?, ?)
+            ON CONFLICT (user_id) DO NOTHING
+        ''', (user_id, shard))
+        conn.commit()
+        shard = conn.execute('SELECT shard FROM user_shards WHERE user_id = ?', (user_id,)).fetchone()[0]
+        conn.close()
+        self._assigned[user_id] = shard
+        return shard
+
+    def paths(self):
+        return [self.shard_path(index) for index in range(self.shard_count)]
+
+    def path_for(self, user_id=None):
+        return self.shard_path(0 if user_id is None else self.shard_index(user_id))
+
+
+def parse_households(value):
+    """Семьи из строки "111,222;333,444": user_id -> id семьи (первый участник)"""
+    households = {}
+    for group in filter(None, value.split(';')):
+        members = [int(member) for member in group.split(',') if member.strip()]
+        for member in members:
+            households[member] = members[0]
+    return households
+
+
+def create_storage_from_env():
+    """Хранилище по переменным окружения
+
+    STORAGE=sqlite (по умолчанию) - файл DB_NAME (expenses.db);
+    STORAGE=sharded - SHARD_COUNT файлов в каталоге SHARD_DIR.
+    Семьи в обоих случаях берутся из HOUSEHOLDS.
+    """
+    kind = os.environ.get('STORAGE', 'sqlite')
+    households = parse_households(os.environ.get('HOUSEHOLDS', ''))
+    if kind == 'sqlite':
+        return SQLiteStorage(os.environ.get('DB_NAME', 'expenses.db'), households)
+    if kind == 'sharded':
+        return ShardedSQLiteStorage(
+            os.environ.get('SHARD_DIR', 'shards'),
+            int(os.environ.get('SHARD_COUNT', '4')),
+            households
+        )
+    if kind in ('postgres', 'postgresql'):
+        raise ValueError("PostgreSQL не поддерживается: база работает только на SQLite (см. storage.py)")
+    raise ValueError(f"Неизвестный тип хранилища: {kind}")
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Как часто записывать время последнего сообщения пользователей (секунды)
+LAST_SEEN_FLUSH_INTERVAL = 60
+
+
+class UserRegistry:
+    """Известные пользователи в памяти: в базу пишется только то, что изменилось"""
+
+    def __init__(self, db):
+        self.db = db
+        # user_id -> (username, first_name)
+        self._known = {}
+        # user_id -> время последнего сообщения, еще не записанное в базу
+        self._last_seen = {}
+
+    def load(self):
+        """Загрузка известных пользователей из базы"""
+        self._known.update(self.db.get_users())
+        logger.info("Известных пользователей: %d", len(self._known))
+
+    def seen(self, user_id, username, first_name):
+        """Отметка о сообщении пользователя. Возвращает True, если данные записаны в базу"""
+        self._last_seen[user_id] = datetime.now()
+
+        profile = (username, first_name)
+        if self._known.get(user_id) == profile:
+            return False
+
+        self.db.add_user(user_id, username, first_name)
+        self._known[user_id] = profile
+        return True
+
+    def flush(self):
+        """Запись накопленного времени последних сообщений одной пачкой"""
+        if not self._last_seen:
+            return 0
+        last_seen, self._last_seen = self._last_seen, {}
+        try:
+            self.db.update_last_seen(last_seen)
+        except Exception:
+            # Пачка не записана - возвращаем ее, не затирая более новые отметки
+            for user_id, seen_at in last_seen.items():
+                self._last_seen.setdefault(user_id, seen_at)
+            raise
+        return len(last_seen)
+
+    async def run(self, interval=LAST_SEEN_FLUSH_INTERVAL):
+        """Фоновая задача периодической записи времени последних сообщений"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                logger.exception("Ошибка записи времени последних сообщений")
@@ -0,0 +1,99 @@
+"""Роутер вебхуков: принимает обновления от Telegram и раздает их процессам бота
+
+Обновления одного пользователя всегда уходят в один и тот же процесс
+(user_id % WORKER_COUNT), поэтому состояние диалогов (ConversationHandler,
+context.user_data) остается локальным для процесса.
+
+Запуск:
+    WORKER_COUNT=4 python webhook_router.py
+    BOT_MODE=webhook WEBHOOK_URL=https://example.com/telegram WORKER_INDEX=0 WORKER_COUNT=4 python bot.py
+    ... (по процессу на каждый WORKER_INDEX)
+"""
+import asyncio
+import json
+import logging
+import os
+
+import httpx
+
+import minihttp
+
+logger = logging.getLogger(__name__)
+
+# Путь, по которому Telegram присылает обновления (и роутеру, и процессам бота)
+WEBHOOK_PATH = '/telegram'
+# Заголовок с секретом вебхука, который нужно передать процессу бота
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+
+def worker_for_user(user_id, worker_count):
+    """Номер процесса бота, который обслуживает пользователя"""
+    return user_id % worker_count
+
+
+def worker_port(worker_index, base_port):
+    """Порт, на котором процесс бота принимает вебхуки"""
+    return base_port + worker_index
+
+
+def extract_user_id(update):
+    """id пользователя из обновления Telegram (0, если пользователя нет)"""
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get('from'), dict):
+            return value['from'].get('id', 0)
+    return 0
+
+
+class WebhookRouter:
+    """Прием вебхуков и пересылка их процессам бота по user_id"""
+
+    def __init__(self, worker_urls):
+        self.worker_urls = worker_urls
+        self._client = httpx.AsyncClient(timeout=30)
+
+    async def handle(self, request):
+        if request.method != 'POST' or request.path != WEBHOOK_PATH:
+            return 404, b''
+
+        try:
+            user_id = extract_user_id(json.loads(request.body))
+        except (ValueError, AttributeError):
+            return 400, b''
+
+        url = self.worker_urls[worker_for_user(user_id, len(self.worker_urls))]
+        headers = {'content-type': 'application/json'}
+        if SECRET_HEADER in request.headers:
+            headers[SECRET_HEADER] = request.headers[SECRET_HEADER]
+
+        try:
+            response = await self._client.post(url, content=request.body, headers=headers)
+        except httpx.HTTPError:
+            logger.exception("Процесс бота %s недоступен", url)
+            # Telegram повторит доставку обновления позже
+            return 502, b''
+        return response.status_code, b''
+
+    async def serve(self, host, port):
+        server = await minihttp.serve(self.handle, host, port)
+        logger.info("Роутер вебхуков слушает %s:%d, процессов бота: %d", host, port, len(self.worker_urls))
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    worker_count = int(os.environ.get('WORKER_COUNT', '1'))
+    base_port = int(os.environ.get('WORKER_BASE_PORT', '8001'))
+    worker_urls = [
+        f"http://127.0.0.1:{worker_port(index, base_port)}{WEBHOOK_PATH}"
+        for index in range(worker_count)
+    ]
+    router = WebhookRouter(worker_urls)
+    asyncio.run(router.serve(os.environ.get('ROUTER_HOST', '0.0.0.0'), int(os.environ.get('ROUTER_PORT', '8000'))))
+
+
+if __name__ == '__main__':
+    main()